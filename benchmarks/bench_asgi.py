@@ -0,0 +1,61 @@
+"""
+Benchmark comparing FuncWebTestMixin's WSGI app with the ASGI app used by
+FuncAsgiTestMixin, using the views from the test project.
+
+For a single request at a time, the ASGI handler has some extra per-request
+overhead (an event loop is started for each request). Where it wins is
+fetching many URLs concurrently, which the WSGI app can only do one at a time.
+
+Run with:
+
+    python benchmarks/bench_asgi.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_functest_tests.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test.utils import setup_test_environment  # noqa: E402
+from django_webtest import DjangoTestApp  # noqa: E402
+
+from django_functest.funcasgi import DjangoAsgiTestApp  # noqa: E402
+
+
+def time_per_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    setup_test_environment()
+    wsgi_app = DjangoTestApp()
+    asgi_app = DjangoAsgiTestApp()
+
+    url = "/async_fragment/1/"
+    print(f"Single request to {url}:")
+    t_wsgi = time_per_call(lambda: wsgi_app.get(url), 200)
+    t_asgi = time_per_call(lambda: asgi_app.get(url), 200)
+    print(f"  WSGI: {t_wsgi * 1e3:.2f} ms  ASGI: {t_asgi * 1e3:.2f} ms")
+    print()
+
+    for count, delay in [(10, 0), (10, 0.05)]:
+        urls = [f"/async_fragment/{i}/?delay={delay}" for i in range(count)]
+        print(f"{count} requests to a view taking {delay * 1e3:.0f} ms:")
+        t_wsgi = time_per_call(lambda: [wsgi_app.get(u) for u in urls], 5)
+        t_asgi_seq = time_per_call(lambda: [asgi_app.get(u) for u in urls], 5)
+        t_asgi_concurrent = time_per_call(lambda: asgi_app.get_concurrently(urls), 5)
+        print(
+            f"  WSGI: {t_wsgi * 1e3:.1f} ms  ASGI sequential: {t_asgi_seq * 1e3:.1f} ms  "
+            f"ASGI concurrent: {t_asgi_concurrent * 1e3:.1f} ms"
+        )
+        print()
+
+
+if __name__ == "__main__":
+    main()
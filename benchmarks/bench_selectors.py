@@ -0,0 +1,59 @@
+"""
+Micro-benchmark comparing PyQuery.find, which translates the CSS selector to
+XPath on every call, with django_functest's cached, compiled selectors.
+
+The saving is a roughly constant amount per query (the cost of translating and
+compiling the selector), so it is most visible on small pages. On large pages
+the time taken to evaluate the query over the document dominates.
+
+Run with:
+
+    python benchmarks/bench_selectors.py
+"""
+
+import timeit
+
+from pyquery import PyQuery
+
+from django_functest.dom import css_select
+
+SELECTORS = [
+    "body",
+    "#result_list tbody tr",
+    "input[name=form-0-name]",
+    "p.myclass",
+    'a:contains("Edit")',
+]
+
+
+def make_page(rows=1000):
+    body = "".join(
+        f'<tr class="row"><td><input name="form-{i}-name" value="{i}"></td><td><a href="/{i}/">Edit {i}</a></td></tr>'
+        for i in range(rows)
+    )
+    table = f'<table id="result_list"><tbody>{body}</tbody></table>'
+    return f'<html><body><p class="myclass">Hello</p>{table}</body></html>'
+
+
+def time_per_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    for rows, number in [(1, 2000), (1000, 20)]:
+        pq = PyQuery(make_page(rows), parser="html")
+        print(f"Page with {rows} table rows:")
+        print(f"  {'selector':<30} {'PyQuery.find':>14} {'css_select':>14} {'saving':>10}")
+        for selector in SELECTORS:
+            assert list(pq.find(selector)) == css_select(pq, selector)
+            t_pyquery = time_per_call(lambda: pq.find(selector), number)
+            t_compiled = time_per_call(lambda: css_select(pq, selector), number)
+            print(
+                f"  {selector:<30} {t_pyquery * 1e6:>11.1f} us {t_compiled * 1e6:>11.1f} us "
+                f"{(t_pyquery - t_compiled) * 1e6:>7.1f} us"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import django
+
 from .base import FuncBaseMixin
 from .files import Upload
 from .funcselenium import FuncSeleniumMixin
@@ -5,6 +7,10 @@ from .funcwebtest import FuncWebTestMixin
 from .server import MultiThreadedLiveServerMixin
 from .utils import AdminLoginMixin, ShortcutLoginMixin
 
+if django.VERSION >= (3, 1):
+    # Needs ASGIStaticFilesHandler and async views, added in Django 3.1
+    from .funcasgi import FuncAsgiTestMixin  # noqa: F401
+
 __version__ = "1.6.2"
 
 __all__ = [
@@ -17,5 +23,8 @@ __all__ = [
     "Upload",
 ]
 
+if django.VERSION >= (3, 1):
+    __all__.append("FuncAsgiTestMixin")
+
 
 FuncCommonApi = FuncBaseMixin
@@ -44,6 +44,24 @@ class FuncBaseMixin:
         """
         raise NotImplementedError()
 
+    def assertTextsPresent(self, texts, within="body", wait=True):
+        """
+        Asserts that each of the texts is present within the body of the current page,
+        or within an element matching the CSS selector passed as `within`. Items in
+        `texts` can also be `(text, within)` tuples. All missing texts are reported
+        in a single failure.
+        """
+        raise NotImplementedError()
+
+    def assertTextsAbsent(self, texts, within="body"):
+        """
+        Asserts that none of the texts are present within the body of the current page,
+        or within any element matching the CSS selector passed as `within`. Items in
+        `texts` can also be `(text, within)` tuples. All texts found are reported
+        in a single failure.
+        """
+        raise NotImplementedError()
+
     def back(self):
         """
         Go back in the browser.
@@ -140,6 +158,73 @@ class FuncBaseMixin:
         """
         raise NotImplementedError()
 
+    def session_transaction(self):
+        """
+        Returns a context manager that yields the Django session, for making
+        several changes to it at once. Changes made inside the block (including
+        by ``set_session_data`` and ``shortcut_login``) are saved once at the
+        end of the block, and discarded if an exception is raised.
+        """
+        raise NotImplementedError()
+
+    def checkpoint(self, name):
+        """
+        Saves the current browser state (cookies, session data and current
+        page) under the given name, so that it can be returned to later, in
+        this or another test in the same class, using ``restore``.
+        """
+        raise NotImplementedError()
+
+    def restore(self, name):
+        """
+        Restores the browser state saved by ``checkpoint`` with the given name.
+        Returns True if it was restored, or False if there is no such checkpoint,
+        or if the database has changed since it was saved.
+        """
+        raise NotImplementedError()
+
+    def get_checkpoint_db_state(self):
+        """
+        Returns a value that changes when rows are added to or deleted from the
+        database, used by ``checkpoint`` and ``restore``. By default this is the
+        row count and maximum primary key of each of ``checkpoint_models`` (or
+        every model apart from session models). Rows updated in place are not
+        detected.
+        """
+        raise NotImplementedError()
+
+    @property
+    def action_log(self):
+        """
+        A list of ``ActionRecord`` objects for the page loads, form submissions
+        and clicks done so far in the test, with timings and query counts.
+        Actions are only recorded if ``record_actions`` is True, or inside
+        ``assertMaxQueries``, ``assertMaxLatency`` and ``assertNoRepeatedQueries``.
+        """
+        raise NotImplementedError()
+
+    def assertMaxQueries(self, num):
+        """
+        Returns a context manager that fails if the actions done inside the
+        block caused more than ``num`` database queries in total.
+        """
+        raise NotImplementedError()
+
+    def assertMaxLatency(self, seconds):
+        """
+        Returns a context manager that fails if any of the actions done inside
+        the block took longer than ``seconds``.
+        """
+        raise NotImplementedError()
+
+    def assertNoRepeatedQueries(self, max_repeats=3):
+        """
+        Returns a context manager that fails if, for any of the actions done
+        inside the block, the same query (apart from parameter values) was run
+        more than ``max_repeats`` times, which usually means an N+1 problem.
+        """
+        raise NotImplementedError()
+
     def new_browser_session(self):
         """
         Creates (and switches to) a new session that is separate from previous
@@ -0,0 +1,86 @@
+import weakref
+from collections import OrderedDict
+
+
+class ParseCache:
+    """
+    LRU cache of parsed documents, keyed on the identity of the object they
+    were parsed from (e.g. a WebTest response).
+
+    Keys are held by weak reference only, so an entry is dropped as soon as its
+    key is garbage collected (e.g. when a response is no longer in
+    ``last_responses``). In addition, the cache is bounded by ``max_entries``
+    and by ``max_bytes``, which is measured using the ``size`` attribute of the
+    cached values. ``None`` means no limit. The most recently added entry is
+    never evicted.
+
+    ``hits``, ``misses`` and ``evictions`` counters are kept for inspection.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # id(key) -> (weakref to key, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(id(key))
+        return entry is not None and entry[0]() is key
+
+    def get(self, key, factory):
+        """
+        Returns the cached value for ``key``, calling ``factory(key)`` to create
+        it if it isn't in the cache.
+        """
+        key_id = id(key)
+        entry = self._entries.get(key_id)
+        if entry is not None and entry[0]() is key:
+            self._entries.move_to_end(key_id)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = factory(key)
+        if entry is not None:
+            # Stale entry for a dead object whose id has been reused.
+            self._remove(key_id)
+        self._entries[key_id] = (weakref.ref(key, self._make_remover(key_id)), value)
+        self.current_bytes += value.size
+        self._evict()
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _evict(self):
+        while len(self._entries) > 1 and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+        ):
+            key_id = next(iter(self._entries))
+            self._remove(key_id)
+            self.evictions += 1
+
+    def _remove(self, key_id):
+        _, value = self._entries.pop(key_id)
+        self.current_bytes -= value.size
+
+    def _make_remover(self, key_id):
+        self_ref = weakref.ref(self)
+
+        def remove(ref):
+            cache = self_ref()
+            if cache is None:
+                return
+            entry = cache._entries.get(key_id)
+            if entry is not None and entry[0] is ref:
+                cache._remove(key_id)
+
+        return remove
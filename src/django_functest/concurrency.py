@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.db import connections
+
+RequestTiming = namedtuple("RequestTiming", ["method", "url", "status", "elapsed"])
+
+# Serialises use of in-memory SQLite connections shared by the worker threads of
+# run_concurrently. These connections are inside the test's transaction, and
+# their savepoint state can't be used by more than one thread at a time.
+_shared_connection_lock = threading.RLock()
+_local = threading.local()
+
+
+class CrowdResult:
+    """
+    The outcome of running a callable for one member of a crowd, see
+    ``FuncWebTestMixin.run_crowd``.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        # Return value of the callable
+        self.value = None
+        # Exception raised by the callable, if any
+        self.exception = None
+        # Time taken by the callable, in seconds
+        self.elapsed = None
+        # All responses received, in order
+        self.responses = []
+        # RequestTiming for every request made, in order
+        self.timings = []
+
+    def __repr__(self):
+        return f"<CrowdResult {self.index} value={self.value!r} exception={self.exception!r}>"
+
+
+def record_requests(app, result):
+    """
+    Makes a WebTest app record all its responses, and the time taken for them,
+    in a ``CrowdResult``.
+    """
+    do_request = app.do_request
+
+    def recording_do_request(req, *args, **kwargs):
+        start = time.perf_counter()
+        response = do_request(req, *args, **kwargs)
+        result.timings.append(RequestTiming(req.method, req.url, response.status_int, time.perf_counter() - start))
+        result.responses.append(response)
+        return response
+
+    app.do_request = recording_do_request
+
+
+@contextmanager
+def shared_database_access():
+    """
+    Context manager for using the database from a worker thread started by
+    ``run_concurrently``. If the worker shares an in-memory SQLite connection
+    with the test, only one thread at a time is allowed in the block, otherwise
+    it does nothing.
+    """
+    if getattr(_local, "sharing_connections", False):
+        with _shared_connection_lock:
+            yield
+    else:
+        yield
+
+
+def serialize_requests(app):
+    """
+    Makes every request done by a WebTest app use ``shared_database_access``.
+    """
+    do_request = app.do_request
+
+    def serialized_do_request(req, *args, **kwargs):
+        with shared_database_access():
+            return do_request(req, *args, **kwargs)
+
+    app.do_request = serialized_do_request
+
+
+def run_concurrently(funcs, max_workers=None, start_together=False):
+    """
+    Calls all the callables in ``funcs`` on a thread pool, returning a list of
+    (return value, exception) tuples in the same order.
+
+    Database connections are handled like LiveServerTestCase does: in-memory
+    SQLite databases are shared with the threads, so that they can see the data
+    created by the test, and other databases use a new connection per thread.
+    Code in the callables that uses the database must do so inside
+    ``shared_database_access()``, or with an app that has been passed to
+    ``serialize_requests``.
+
+    If ``start_together`` is True, and there are enough workers to run all the
+    callables at once, they all wait for each other before starting, so that
+    they overlap as much as possible.
+    """
+    funcs = list(funcs)
+    if not funcs:
+        return []
+    if max_workers is None:
+        max_workers = len(funcs)
+    barrier = threading.Barrier(len(funcs)) if start_together and max_workers >= len(funcs) else None
+
+    shared_connections = {}
+    for conn in connections.all():
+        if conn.vendor == "sqlite" and conn.is_in_memory_db():
+            shared_connections[conn.alias] = conn
+
+    def run(func):
+        for alias, conn in shared_connections.items():
+            connections[alias] = conn
+        _local.sharing_connections = bool(shared_connections)
+        try:
+            if barrier is not None:
+                barrier.wait()
+            return func(), None
+        except Exception as e:
+            return None, e
+        finally:
+            _local.sharing_connections = False
+            # Doesn't close shared in-memory databases
+            connections.close_all()
+
+    for conn in shared_connections.values():
+        conn.inc_thread_sharing()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, funcs))
+    finally:
+        for conn in shared_connections.values():
+            conn.dec_thread_sharing()
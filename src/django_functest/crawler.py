@@ -0,0 +1,157 @@
+import re
+import time
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from pyquery.pyquery import PyQuery
+
+from .concurrency import run_concurrently, shared_database_access
+from .dom import ParsedDocument
+from .instrumentation import QueryCounter
+from .subresources import same_site_urls
+
+CrawledPage = namedtuple("CrawledPage", ["url", "status", "elapsed", "queries", "depth", "referrer", "error"])
+
+
+class CrawlReport:
+    """
+    The result of crawling a site, see ``FuncWebTestMixin.crawl``.
+    """
+
+    def __init__(self):
+        # CrawledPage for every URL visited, in the order they were visited
+        self.pages = []
+        # Total time taken, in seconds
+        self.elapsed = None
+
+    @property
+    def failures(self):
+        """
+        CrawledPage objects for pages that returned an error status, or raised
+        an exception.
+        """
+        return [page for page in self.pages if page.status is None or page.status >= 400]
+
+    def slowest(self, count=10):
+        """
+        Returns the ``count`` slowest pages, slowest first.
+        """
+        return sorted(self.pages, key=lambda page: page.elapsed, reverse=True)[:count]
+
+    def __str__(self):
+        lines = [f"Crawled {len(self.pages)} pages in {self.elapsed or 0:.2f}s"]
+        failures = self.failures
+        if failures:
+            lines.append("Failing pages:")
+            for page in failures:
+                problem = page.status if page.error is None else page.error
+                lines.append(f"  {page.url}: {problem} (linked from {page.referrer or 'start'})")
+        lines.append("Slowest pages:")
+        for page in self.slowest():
+            lines.append(f"  {page.url}: {page.elapsed * 1000:.1f} ms, {page.queries} queries")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"<CrawlReport pages={len(self.pages)} failures={len(self.failures)}>"
+
+
+def normalize_url(url):
+    """
+    Normalizes a relative URL (path and query string), so that URLs that are
+    the same page are not visited twice.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(("", "", parts.path or "/", query, ""))
+
+
+def _matches(url, patterns):
+    return any(re.search(pattern, url) for pattern in patterns)
+
+
+def crawl(app, start_urls, max_depth=None, max_pages=None, include=None, exclude=None, concurrency=8):
+    """
+    Crawls a site breadth-first using a WebTest app, starting from
+    ``start_urls``, and following links to pages on the same site. Returns a
+    CrawlReport.
+
+    Each level of the crawl is fetched concurrently using ``concurrency``
+    threads. ``include`` and ``exclude`` are lists of regular expressions that
+    links must match, or not match, to be followed.
+    """
+    include = [include] if isinstance(include, (str, re.Pattern)) else list(include or [])
+    exclude = [exclude] if isinstance(exclude, (str, re.Pattern)) else list(exclude or [])
+
+    def allowed(url):
+        return (not include or _matches(url, include)) and not _matches(url, exclude)
+
+    counter = QueryCounter()
+    report = CrawlReport()
+    start = time.perf_counter()
+
+    def make_fetch(url, depth, referrer):
+        def fetch():
+            counter.install()
+            counter.reset()
+            fetch_start = time.perf_counter()
+            try:
+                with shared_database_access():
+                    response = app.get(url, expect_errors=True)
+            except Exception as e:
+                elapsed = time.perf_counter() - fetch_start
+                return CrawledPage(url, None, elapsed, counter.count, depth, referrer, repr(e)), []
+            elapsed = time.perf_counter() - fetch_start
+            page = CrawledPage(url, response.status_int, elapsed, counter.count, depth, referrer, None)
+            return page, _find_links(response)
+
+        return fetch
+
+    visited = set()
+    frontier = []
+    for url in start_urls:
+        url = normalize_url(url)
+        if url not in visited:
+            visited.add(url)
+            frontier.append((url, 0, None))
+
+    counter.install()
+    try:
+        while frontier:
+            if max_pages is not None:
+                frontier = frontier[: max_pages - len(report.pages)]
+            outcomes = run_concurrently(
+                [make_fetch(url, depth, referrer) for url, depth, referrer in frontier], max_workers=concurrency
+            )
+            next_frontier = []
+            for (url, depth, referrer), (outcome, exception) in zip(frontier, outcomes):
+                if exception is not None:
+                    raise exception
+                page, links = outcome
+                report.pages.append(page)
+                if max_depth is not None and depth >= max_depth:
+                    continue
+                for link in links:
+                    link = normalize_url(link)
+                    if link not in visited and allowed(link):
+                        visited.add(link)
+                        next_frontier.append((link, depth + 1, url))
+            frontier = next_frontier
+    finally:
+        counter.uninstall()
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def _find_links(response):
+    page_url = response.request.url
+    if 300 <= response.status_int < 400:
+        location = response.headers.get("Location")
+        if location is None:
+            return []
+        return [url for url in [urljoin(page_url, location)] if urlsplit(url).netloc == urlsplit(page_url).netloc]
+    if response.status_int >= 400 or "html" not in response.content_type:
+        return []
+    # Not using the test case's parse cache, which isn't thread safe.
+    body = response.testbody
+    document = ParsedDocument(PyQuery(body, parser="html"), size=len(body))
+    return same_site_urls(document, page_url, [elem.get("href") for elem in document.index.by_tag.get("a", [])])
@@ -0,0 +1,322 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+from lxml import etree
+from pyquery.cssselectpatch import JQueryTranslator
+
+# Translators matching those that PyQuery uses for 'html' and 'xml' parsers.
+_TRANSLATORS = {
+    False: JQueryTranslator(xhtml=False),
+    True: JQueryTranslator(xhtml=True),
+}
+
+# Simple selectors that can be answered from a DomIndex. Anything else falls
+# back to a full CSS query. Apart from escaped quotes in :contains(), values
+# containing backslashes are not matched, so that we never have to implement
+# CSS escaping rules ourselves.
+_IDENT = r"-?[A-Za-z_][\w-]*"
+_TAG_RE = re.compile(r"^(?P<tag>[A-Za-z][\w-]*)$")
+_ID_RE = re.compile(rf"^(?P<tag>[A-Za-z][\w-]*)?#(?P<id>{_IDENT})$")
+_ATTR_RE = re.compile(
+    rf"""^(?P<tag>[A-Za-z][\w-]*)?\[(?P<attr>name|href)=(?:"(?P<dq>[^"\\]*)"|'(?P<sq>[^'\\]*)'|(?P<ident>{_IDENT}))\]$"""
+)
+_STREAM_SELECTOR_RE = re.compile(rf"^(?P<tag>[A-Za-z][\w-]*)?(?:#(?P<id>{_IDENT}))?$")
+_SERIALIZED_TOKEN_RE = re.compile(r"<!--.*?-->|<\?.*?\?>|</[^>]*>|<[^>]*>", re.DOTALL)
+_CONTAINS_RE = re.compile(r"""^a:contains\((?:"(?P<dq>(?:[^"\\]|\\")*)"|'(?P<sq>(?:[^'\\]|\\')*)')\)$""")
+
+
+@lru_cache(maxsize=2048)
+def compile_selector(css_selector, xhtml=False):
+    """
+    Returns a compiled ``lxml.etree.XPath`` for the CSS selector. Results are
+    cached for the whole process, because the same selectors are used many
+    times over in a test suite.
+    """
+    # Same translation that PyQuery.find does
+    xpath = _TRANSLATORS[xhtml].css_to_xpath(css_selector.replace("[@", "["), prefix="descendant-or-self::")
+    return etree.XPath(xpath)
+
+
+def css_select(pyquery_obj, css_selector):
+    """
+    Returns a list of elements matching the CSS selector, with the same results
+    as ``pyquery_obj.find(css_selector)``, but using a compiled selector.
+    """
+    xpath = compile_selector(css_selector, xhtml=pyquery_obj.parser == "xml")
+    elements = []
+    for root in pyquery_obj:
+        for child in root:
+            if isinstance(child.tag, str):
+                elements.extend(xpath(child))
+    return elements
+
+
+def stream_search(source, css_selector, norm_text, chunk_size=64 * 1024):
+    """
+    Searches HTML ``source`` for ``norm_text`` (text in escaped, serialized
+    form) inside elements matching ``css_selector``, using an incremental
+    parser that stops as soon as a match is found. Only text that lies entirely
+    within a single text node can be found this way.
+
+    Returns True if a match is found, False if not, or None if the search
+    can't be done this way (only simple ``tag``, ``#id`` and ``tag#id``
+    selectors are supported). False does not mean the text is absent, only
+    that the full document needs to be checked.
+    """
+    m = _STREAM_SELECTOR_RE.match(css_selector.strip())
+    if not m or not css_selector.strip() or "\r" in norm_text:
+        # lxml escapes \r in output, so our escaping wouldn't match.
+        return None
+    tag = m.group("tag").lower() if m.group("tag") else None
+    elem_id = m.group("id")
+
+    def matches(elem):
+        return (tag is None or elem.tag == tag) and (elem_id is None or elem.get("id") == elem_id)
+
+    def text_contains(text):
+        return text is not None and norm_text in text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    inside = 0
+
+    def process_events():
+        nonlocal inside
+        for event, elem in parser.read_events():
+            if event == "start":
+                if matches(elem):
+                    inside += 1
+                continue
+            # At the 'end' event, the text of an element and the tails of its
+            # children are complete, so each text node is checked exactly once.
+            if inside and (text_contains(elem.text) or any(text_contains(child.tail) for child in elem)):
+                return True
+            if matches(elem):
+                inside -= 1
+            # Contents have been checked, so can be discarded to save memory.
+            del elem[:]
+        return False
+
+    for pos in range(0, len(source), chunk_size):
+        parser.feed(source[pos : pos + chunk_size])
+        if process_events():
+            return True
+    parser.close()
+    return process_events()
+
+
+class ParsedDocument:
+    """
+    A parsed document, plus things derived from it that are worth keeping
+    around for as long as the document itself.
+    """
+
+    def __init__(self, pyquery_obj, size):
+        self.pq = pyquery_obj
+        # Approximate size, used for cache budgeting.
+        self.size = size
+        self._index = None
+        self._serialized = None
+        self._ranges = None
+        self._element_strings = {}
+
+    @property
+    def index(self):
+        # Built lazily, on the first lookup against the document
+        if self._index is None:
+            self._index = DomIndex(self.pq)
+        return self._index
+
+    def select(self, css_selector):
+        """
+        Returns a list of elements matching the CSS selector.
+        """
+        if self.pq.parser == "html":
+            elems = self.index.find(css_selector)
+            if elems is not None:
+                return elems
+        return css_select(self.pq, css_selector)
+
+    def serialize(self, elem):
+        """
+        Returns ``etree.tostring(elem, encoding="unicode")``, without
+        serializing anything more than once.
+        """
+        span = self._get_span(elem)
+        if span is not None:
+            return self._serialized[span[0] : span[1]]
+        return self._get_element_string(elem)
+
+    def serialized_contains(self, elem, text):
+        """
+        Returns True if ``text`` is found in the serialized form of ``elem``.
+        """
+        span = self._get_span(elem)
+        if span is not None:
+            return self._serialized.find(text, span[0], span[1]) != -1
+        return text in self._get_element_string(elem)
+
+    def _get_span(self, elem):
+        if self._ranges is None:
+            self._serialize_document()
+        return self._ranges.get(elem)
+
+    def _get_element_string(self, elem):
+        # Fallback for documents we can't map offsets for.
+        try:
+            return self._element_strings[elem]
+        except KeyError:
+            retval = self._element_strings[elem] = etree.tostring(elem, encoding="unicode")
+            return retval
+
+    def _serialize_document(self):
+        # The whole document is serialized once, and the span of each element
+        # (including its tail, like etree.tostring) is found by scanning the tags
+        # in the output. This only works for HTML documents, where there are no
+        # namespace declarations that would appear in the output of
+        # etree.tostring on a sub-element but not in the document output.
+        self._ranges = {}
+        if self.pq.parser != "html" or len(self.pq) != 1:
+            return
+        root = self.pq[0]
+        serialized = etree.tostring(root, encoding="unicode")
+        elements = (elem for elem in root.iter() if isinstance(elem.tag, str))
+        ranges = {}
+        stack = []
+        for match in _SERIALIZED_TOKEN_RE.finditer(serialized):
+            token = match.group()
+            if token.startswith(("<!--", "<?")):
+                continue
+            if token.startswith("</"):
+                if not stack:
+                    return
+                elem, start = stack.pop()
+            else:
+                elem = next(elements, None)
+                if elem is None or token[1:].split(None, 1)[0].rstrip("/>") != elem.tag:
+                    # Not what we expected, don't use offsets at all.
+                    return
+                start = match.start()
+                if not token.endswith("/>"):
+                    stack.append((elem, start))
+                    continue
+            # Element is closed, the tail goes up to the next tag.
+            end = serialized.find("<", match.end())
+            ranges[elem] = (start, len(serialized) if end == -1 else end)
+        if stack or next(elements, None) is not None:
+            return
+        self._serialized = serialized
+        self._ranges = ranges
+
+
+class DomIndex:
+    """
+    Index of a parsed document, mapping ids, names, tags, link hrefs and link
+    text to elements. All lookups return elements in document order.
+    """
+
+    def __init__(self, pyquery_obj):
+        self.by_id = defaultdict(list)
+        self.by_name = defaultdict(list)
+        self.by_tag = defaultdict(list)
+        self.links_by_href = defaultdict(list)
+        self.links = []
+        # Matches PyQuery.find, which searches descendants of the root elements
+        for root in pyquery_obj:
+            for elem in root.iterdescendants():
+                tag = elem.tag
+                if not isinstance(tag, str):
+                    # Comments, processing instructions
+                    continue
+                self.by_tag[tag].append(elem)
+                attrib = elem.attrib
+                if "id" in attrib:
+                    self.by_id[attrib["id"]].append(elem)
+                if "name" in attrib:
+                    self.by_name[attrib["name"]].append(elem)
+                if tag == "a":
+                    self.links.append(elem)
+                    if "href" in attrib:
+                        self.links_by_href[attrib["href"]].append(elem)
+        self._link_texts = None
+        self._form_of = None
+        self._form_positions = None
+
+    def find(self, css_selector):
+        """
+        Returns a list of elements matching the CSS selector, or None if the
+        selector is not simple enough to be answered from the index.
+        """
+        css_selector = css_selector.strip()
+
+        m = _TAG_RE.match(css_selector)
+        if m:
+            return list(self.by_tag.get(m.group("tag").lower(), []))
+
+        m = _ID_RE.match(css_selector)
+        if m:
+            return self._filter_tag(self.by_id.get(m.group("id"), []), m.group("tag"))
+
+        m = _ATTR_RE.match(css_selector)
+        if m:
+            value = next(v for v in m.group("dq", "sq", "ident") if v is not None)
+            tag = m.group("tag")
+            if m.group("attr") == "name":
+                return self._filter_tag(self.by_name.get(value, []), tag)
+            if tag is not None and tag.lower() == "a":
+                return list(self.links_by_href.get(value, []))
+            return None
+
+        m = _CONTAINS_RE.match(css_selector)
+        if m:
+            if m.group("dq") is not None:
+                text = m.group("dq").replace('\\"', '"')
+            else:
+                text = m.group("sq").replace("\\'", "'")
+            return self.find_links_containing(text)
+
+        return None
+
+    def find_links_containing(self, text):
+        """
+        Returns the ``<a>`` elements whose text content contains ``text``
+        (the semantics of ``a:contains(...)``).
+        """
+        # This is a scan over links only, not the whole document, and the text
+        # content of each link is computed just once.
+        if self._link_texts is None:
+            self._link_texts = [(elem.text_content(), elem) for elem in self.links]
+        return [elem for link_text, elem in self._link_texts if text in link_text]
+
+    def get_form(self, elem):
+        """
+        Returns the nearest ``<form>`` ancestor of ``elem``, or None
+        """
+        if self._form_of is None:
+            self._build_form_map()
+        return self._form_of.get(elem)
+
+    def get_form_position(self, form_elem):
+        """
+        Returns the position of ``form_elem`` amongst all the forms in the document.
+        """
+        if self._form_positions is None:
+            self._build_form_map()
+        return self._form_positions[form_elem]
+
+    def _build_form_map(self):
+        # Computed once per document. Forms are processed in document order, so
+        # for (invalid) nested forms the innermost form wins, like a recursive
+        # search up the ancestors would find.
+        self._form_of = {}
+        self._form_positions = {}
+        for i, form_elem in enumerate(self.by_tag.get("form", [])):
+            self._form_positions[form_elem] = i
+            for elem in form_elem.iterdescendants():
+                self._form_of[elem] = form_elem
+
+    def _filter_tag(self, elems, tag):
+        if tag is None:
+            return list(elems)
+        tag = tag.lower()
+        return [e for e in elems if e.tag == tag]
@@ -0,0 +1,174 @@
+import asyncio
+from contextlib import contextmanager
+from http.client import responses as http_reasons
+
+from asgiref.sync import async_to_sync
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+from django.core import signals
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django_webtest import DjangoTestApp
+from webtest import utils as webtest_utils
+
+from .funcwebtest import FuncWebTestMixin
+
+# environ key for a response that has already been fetched, see
+# DjangoAsgiTestApp.get_concurrently
+_RESULT_ENVIRON_KEY = "django_functest.asgi_result"
+
+
+class AsgiTransport:
+    """
+    A WSGI application that passes requests on to an ASGI application, in the
+    same process, so that WebTest can be used to test an ASGI application.
+    """
+
+    def __init__(self, asgi_app):
+        self.asgi_app = asgi_app
+
+    def __call__(self, environ, start_response):
+        if _RESULT_ENVIRON_KEY in environ:
+            status, headers, body = environ.pop(_RESULT_ENVIRON_KEY)
+        else:
+            status, headers, body = async_to_sync(self.call_async)(environ)
+        start_response(f"{status} {http_reasons.get(status, 'Unknown')}", headers)
+        return [body]
+
+    def call_many(self, environs):
+        """
+        Runs the requests for a list of WSGI environs concurrently, returning
+        a list of (status, headers, body) tuples.
+        """
+
+        async def gather():
+            return await asyncio.gather(*[self.call_async(environ) for environ in environs])
+
+        return async_to_sync(gather)()
+
+    async def call_async(self, environ):
+        """
+        Runs the request for a WSGI environ, returning (status, headers, body)
+        """
+        body = environ["wsgi.input"].read(int(environ.get("CONTENT_LENGTH") or 0))
+        request_sent = False
+        response = {"status": None, "headers": [], "body": []}
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # There are no client disconnects, so block until the handler
+            # cancels us.
+            await asyncio.Future()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.asgi_app(environ_to_scope(environ), receive, send)
+        return response["status"], response["headers"], b"".join(response["body"])
+
+
+def environ_to_scope(environ):
+    """
+    Returns an ASGI HTTP connection scope for a WSGI environ.
+    """
+    headers = []
+    for key, value in environ.items():
+        if key.startswith("HTTP_"):
+            name = key[5:].replace("_", "-")
+        elif key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = key.replace("_", "-")
+        else:
+            continue
+        if value:
+            headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+    # WSGI strings are bytes decoded as latin-1, ASGI paths are decoded as UTF-8
+    root_path = environ.get("SCRIPT_NAME", "").encode("latin-1")
+    path = environ.get("PATH_INFO", "").encode("latin-1")
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": environ.get("SERVER_PROTOCOL", "HTTP/1.1").split("/", 1)[-1],
+        "method": environ["REQUEST_METHOD"],
+        "scheme": environ.get("wsgi.url_scheme", "http"),
+        "root_path": root_path.decode("utf-8"),
+        "path": (root_path + path).decode("utf-8"),
+        "raw_path": root_path + path,
+        "query_string": environ.get("QUERY_STRING", "").encode("latin-1"),
+        "headers": headers,
+        "client": (environ.get("REMOTE_ADDR", "127.0.0.1"), int(environ.get("REMOTE_PORT") or 0)),
+        "server": (environ.get("SERVER_NAME", "testserver"), int(environ.get("SERVER_PORT") or 80)),
+    }
+
+
+@contextmanager
+def _keep_connections():
+    # Like DjangoTestApp.do_request, stop Django closing database connections
+    # at the end of requests, which would break the transactions that tests
+    # are run in.
+    signals.request_started.disconnect(close_old_connections)
+    signals.request_finished.disconnect(close_old_connections)
+    try:
+        yield
+    finally:
+        signals.request_started.connect(close_old_connections)
+        signals.request_finished.connect(close_old_connections)
+
+
+class DjangoAsgiTestApp(DjangoTestApp):
+    """
+    A ``django_webtest.DjangoTestApp`` that uses Django's ASGI handler.
+    """
+
+    def get_wsgi_handler(self):
+        return AsgiTransport(ASGIStaticFilesHandler(ASGIHandler()))
+
+    def get_concurrently(self, urls, expect_errors=False):
+        """
+        Does GET requests for all the URLs concurrently, returning a list of
+        responses. Cookies set by the responses are processed in order, after
+        all the requests have been done.
+        """
+        requests = []
+        for url in urls:
+            environ = self._make_environ()
+            url = self._remove_fragment(str(url))
+            url, environ["QUERY_STRING"] = url.split("?", 1) if "?" in url else (url, "")
+            request = self.RequestClass.blank(url, environ)
+            request.environ.setdefault("REMOTE_ADDR", "127.0.0.1")
+            self.cookiejar.add_cookie_header(webtest_utils._RequestCookieAdapter(request))
+            requests.append(request)
+
+        transport = self.app
+        with _keep_connections():
+            results = transport.call_many([request.environ.copy() for request in requests])
+
+        # Each result is then passed through the normal WebTest machinery.
+        responses = []
+        for request, result in zip(requests, results):
+            request.environ[_RESULT_ENVIRON_KEY] = result
+            responses.append(self.do_request(request, status=None, expect_errors=expect_errors))
+        return responses
+
+
+class FuncAsgiTestMixin(FuncWebTestMixin):
+    """
+    Like ``FuncWebTestMixin``, but requests are handled by Django's ASGI
+    handler instead of the WSGI one.
+    """
+
+    app_class = DjangoAsgiTestApp
+
+    def get_literal_urls_concurrently(self, urls, expect_errors=False):
+        """
+        Fetches all the URLs concurrently, and returns a list of the responses.
+        The current page is not changed.
+        """
+        return self.app.get_concurrently(urls, expect_errors=expect_errors)
@@ -1,15 +1,29 @@
+import json
 import logging
 import os.path
 import platform
 import random
+import re
 import tempfile
 import time
+import weakref
 from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
 
+from cssselect import SelectorError
 from django.conf import settings
+from django.utils.html import escape
 from pyquery import PyQuery
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, NoSuchWindowException, StaleElementReferenceException
+from selenium.common.exceptions import (
+    JavascriptException,
+    NoSuchElementException,
+    NoSuchWindowException,
+    StaleElementReferenceException,
+    TimeoutException,
+    UnexpectedAlertPresentException,
+    WebDriverException,
+)
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -17,8 +31,10 @@ from selenium.webdriver.remote.command import Command
 from selenium.webdriver.support.ui import Select, WebDriverWait
 
 from .base import FuncBaseMixin
+from .dom import ParsedDocument
 from .exceptions import SeleniumCantUseElement
-from .utils import BrowserSessionToken, CommonMixin, NotPassed, get_session_store
+from .files import Upload
+from .utils import BrowserSessionToken, CommonMixin, NotPassed, group_texts_by_selector, html_norm
 
 try:
     from django.urls import reverse
@@ -28,6 +44,355 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# File extensions for the resource types in `resource_type_blocklist`. Chrome's
+# Network.setBlockedURLs only matches URLs, so types are blocked by extension.
+_RESOURCE_TYPE_EXTENSIONS = {
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"],
+    "media": ["mp4", "webm", "ogg", "ogv", "mp3", "wav", "m4a", "mov"],
+    "script": ["js", "mjs"],
+    "stylesheet": ["css"],
+}
+
+# Blocked URL patterns that match every URL on a site, which WebDriver BiDi can
+# intercept without a wildcard. The port isn't given to BiDi, so it matches any.
+_BIDI_SITE_PATTERN_RE = re.compile(r"^(?P<protocol>https?)://(?P<hostname>[^/:?#*@]+)(?::\d+)?/\*$")
+
+# Driver -> list of URLs blocked but not yet counted, for drivers that block
+# requests using WebDriver BiDi.
+_bidi_blocked_requests = weakref.WeakKeyDictionary()
+
+# Scripts for _wait_for_async_script. They are passed the maximum time to wait
+# in milliseconds, and call back with true as soon as the event happens.
+
+# The page has been replaced since `document.pageReloadedYetFlag` was set (while
+# the old page is still there, the script is aborted when it is unloaded), and,
+# if `checkLoaded` is true, the new page has finished loading.
+_PAGE_READY_FUNCTION = """
+function pageReady(checkLoaded) {
+    if (document.pageReloadedYetFlag === "notyet") {
+        return false;
+    }
+    if (checkLoaded && (document.body === null || document.readyState !== "complete")) {
+        return false;
+    }
+    // The size of the document is returned for the action log, to save a
+    // round trip.
+    var entries = performance.getEntriesByType ? performance.getEntriesByType("navigation") : [];
+    return {size: entries.length ? entries[0].encodedBodySize : 0};
+}
+"""
+
+_WAIT_FOR_PAGE_SCRIPT = _PAGE_READY_FUNCTION + """
+var checkLoaded = arguments[1];
+var done = arguments[arguments.length - 1];
+var state = pageReady(checkLoaded);
+if (state) {
+    done(state);
+    return;
+}
+window.addEventListener("load", function () { done(pageReady(checkLoaded)); });
+setTimeout(function () { done(false); }, arguments[0]);
+"""
+
+# The same check, without waiting, for drivers without execute_async_script.
+_PAGE_READY_SCRIPT = _PAGE_READY_FUNCTION + "return pageReady(arguments[0]);"
+
+# Everything about a form element needed by `fill` and `value`, in one round
+# trip. For radio buttons, this includes all the buttons in the same group.
+# Elements that aren't `visible` (i.e. not rendered) are not scrolled to.
+_DESCRIBE_ELEMENT_SCRIPT = """
+var elem = arguments[0];
+var description = {
+    tag: elem.tagName.toLowerCase(),
+    type: (elem.type || "").toLowerCase(),
+    value: elem.value === undefined ? null : elem.value,
+    checked: Boolean(elem.checked),
+    visible: elem.getClientRects().length > 0,
+    radios: null
+};
+if (description.tag === "input" && description.type === "radio") {
+    var radios = (elem.form || document).querySelectorAll('input[type="radio"]');
+    description.radios = Array.prototype.filter.call(radios, function (radio) {
+        return radio.name === elem.name;
+    }).map(function (radio) {
+        return {
+            element: radio,
+            value: radio.value,
+            checked: radio.checked,
+            visible: radio.getClientRects().length > 0
+        };
+    });
+}
+return description;
+"""
+
+# Searches for texts in the elements matching CSS selectors, for the text
+# assertions. Elements are serialized the way lxml's `etree.tostring` does it
+# for `page_source` parsed by PyQuery (including the tail text), so that the
+# results are the same as searching the parsed page source. Returns null if a
+# selector can't be used with querySelectorAll.
+_SEARCH_TEXTS_SCRIPT = """
+var queries = arguments[0];
+var serialized = new Map();
+function escapeText(text) {
+    return text.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+}
+function escapeAttribute(value) {
+    return escapeText(value).replace(/"/g, "&quot;").replace(/\\n/g, "&#10;").replace(/\\r/g, "&#13;")
+        .replace(/\\t/g, "&#9;");
+}
+function serializeNode(node, parts) {
+    if (node.nodeType === Node.TEXT_NODE) {
+        parts.push(escapeText(node.data));
+    } else if (node.nodeType === Node.COMMENT_NODE) {
+        parts.push("<!--" + node.data + "-->");
+    } else if (node.nodeType === Node.ELEMENT_NODE) {
+        var tag = node.nodeName.toLowerCase();
+        parts.push("<" + tag);
+        for (var i = 0; i < node.attributes.length; i++) {
+            var attribute = node.attributes[i];
+            parts.push(" " + attribute.name.toLowerCase() + '="' + escapeAttribute(attribute.value) + '"');
+        }
+        var children = (tag === "template" ? node.content : node).childNodes;
+        if (children.length === 0) {
+            parts.push("/>");
+            return;
+        }
+        parts.push(">");
+        for (var j = 0; j < children.length; j++) {
+            serializeNode(children[j], parts);
+        }
+        parts.push("</" + tag + ">");
+    }
+}
+function serialize(elem) {
+    if (!serialized.has(elem)) {
+        var parts = [];
+        serializeNode(elem, parts);
+        for (var node = elem.nextSibling; node && node.nodeType === Node.TEXT_NODE; node = node.nextSibling) {
+            parts.push(escapeText(node.data));
+        }
+        serialized.set(elem, parts.join(""));
+    }
+    return serialized.get(elem);
+}
+function snippet(source, index, length) {
+    var start = Math.max(0, index - 60);
+    var end = Math.min(source.length, index + length + 60);
+    return (start > 0 ? "..." : "") + source.slice(start, end) + (end < source.length ? "..." : "");
+}
+var results = [];
+for (var i = 0; i < queries.length; i++) {
+    var elems;
+    try {
+        elems = document.querySelectorAll(queries[i][0]);
+    } catch (e) {
+        return null;
+    }
+    results.push([elems.length, queries[i][1].map(function (text) {
+        for (var j = 0; j < elems.length; j++) {
+            var source = serialize(elems[j]);
+            var index = source.indexOf(text);
+            if (index !== -1) {
+                return [true, snippet(source, index, text.length)];
+            }
+        }
+        var first = elems.length ? serialize(elems[0]) : "";
+        return [false, first.length > 200 ? first.slice(0, 200) + "..." : first];
+    })]);
+}
+return results;
+"""
+
+# For `dom_snapshots`. Installs a MutationObserver on the document, if there
+# isn't one already, that counts changes to the DOM. Returns the DOM version,
+# and the HTML of the document, unless the version is the one passed in.
+_DOM_SNAPSHOT_SCRIPT = """
+var knownVersion = arguments[0];
+var state = document.__functestDomState;
+if (!state) {
+    state = document.__functestDomState = {id: Math.random().toString(36).slice(2), count: 0};
+    state.observer = new MutationObserver(function () { state.count++; });
+    state.observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+}
+if (state.observer.takeRecords().length) {
+    state.count++;
+}
+var version = state.id + ":" + state.count;
+return [version, version === knownVersion ? null : document.documentElement.outerHTML];
+"""
+
+# Attributes that WebDriver's Get Element Attribute returns as "true" if present
+_BOOLEAN_ATTRIBUTES = frozenset(
+    [
+        "allowfullscreen",
+        "allowpaymentrequest",
+        "allowusermedia",
+        "async",
+        "autofocus",
+        "autoplay",
+        "checked",
+        "compact",
+        "complete",
+        "controls",
+        "declare",
+        "default",
+        "defaultchecked",
+        "defaultselected",
+        "defer",
+        "disabled",
+        "ended",
+        "formnovalidate",
+        "hidden",
+        "indeterminate",
+        "iscontenteditable",
+        "ismap",
+        "itemscope",
+        "loop",
+        "multiple",
+        "muted",
+        "nohref",
+        "nomodule",
+        "noresize",
+        "noshade",
+        "novalidate",
+        "nowrap",
+        "open",
+        "paused",
+        "playsinline",
+        "pubdate",
+        "readonly",
+        "required",
+        "reversed",
+        "scoped",
+        "seamless",
+        "seeking",
+        "selected",
+        "truespeed",
+        "typemustmatchmimetype",
+        "willvalidate",
+    ]
+)
+
+# Fills fields for `fill` when `fast_fill` is on. Stops at the first field
+# that needs filling the normal way, returning its index.
+_FAST_FILL_SCRIPT = """
+var fields = arguments[0];
+var excludeSelector = arguments[1];
+function find(selectors) {
+    var root = document;
+    var elem = null;
+    for (var i = 0; i < selectors.length; i++) {
+        if (i > 0) {
+            root = elem.shadowRoot;
+            if (!root) {
+                return null;
+            }
+        }
+        elem = root.querySelector(selectors[i]);
+        if (!elem) {
+            return null;
+        }
+    }
+    return elem;
+}
+function fire(elem, type) {
+    elem.dispatchEvent(new Event(type, {bubbles: true}));
+}
+function setValue(elem, value) {
+    // Using the prototype's setter means that frameworks which track the
+    // value (such as React) notice the change.
+    var descriptor = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(elem), "value");
+    if (descriptor && descriptor.set) {
+        descriptor.set.call(elem, value);
+    } else {
+        elem.value = value;
+    }
+}
+for (var i = 0; i < fields.length; i++) {
+    var elem = find(fields[i][0]);
+    var value = fields[i][1];
+    if (!elem || elem.disabled || elem.readOnly || elem.getClientRects().length === 0 ||
+            (excludeSelector && elem.matches(excludeSelector))) {
+        return i;
+    }
+    var tag = elem.tagName.toLowerCase();
+    var type = (elem.getAttribute("type") || "").toLowerCase();
+    if (tag === "select") {
+        var option = Array.prototype.find.call(elem.options, function (o) { return o.value === String(value); });
+        if (!option) {
+            return i;
+        }
+        if (!option.selected) {
+            option.selected = true;
+            fire(elem, "input");
+            fire(elem, "change");
+        }
+    } else if (tag === "input" && type === "checkbox") {
+        if (elem.checked !== Boolean(value)) {
+            elem.click();
+        }
+    } else if (tag === "input" && type === "radio") {
+        var radios = (elem.form || document).querySelectorAll('input[type="radio"]');
+        var radio = Array.prototype.find.call(radios, function (r) {
+            return r.name === elem.name && r.value === String(value);
+        });
+        if (!radio) {
+            return i;
+        }
+        if (!radio.checked) {
+            radio.click();
+        }
+    } else if ((tag === "input" && type !== "file") || tag === "textarea") {
+        value = String(value);
+        if (elem.maxLength >= 0) {
+            value = value.slice(0, elem.maxLength);
+        }
+        elem.focus();
+        setValue(elem, value);
+        fire(elem, "input");
+        fire(elem, "change");
+    } else {
+        return i;
+    }
+}
+return fields.length;
+"""
+
+# Collects Navigation Timing, Resource Timing, LCP and CLS in one round trip.
+# PerformanceObserver.takeRecords() returns buffered entries synchronously.
+_PAGE_METRICS_SCRIPT = """
+var nav = performance.getEntriesByType("navigation")[0];
+var resources = performance.getEntriesByType("resource");
+var supported = (window.PerformanceObserver && PerformanceObserver.supportedEntryTypes) || [];
+function takeBuffered(type) {
+    if (supported.indexOf(type) === -1) {
+        return null;
+    }
+    var observer = new PerformanceObserver(function () {});
+    observer.observe({type: type, buffered: true});
+    var entries = observer.takeRecords();
+    observer.disconnect();
+    return entries;
+}
+var lcpEntries = takeBuffered("largest-contentful-paint");
+var shiftEntries = takeBuffered("layout-shift");
+var transferBytes = nav ? nav.transferSize : 0;
+resources.forEach(function (entry) { transferBytes += entry.transferSize; });
+return {
+    ttfb: nav ? nav.responseStart : null,
+    dom_content_loaded: nav && nav.domContentLoadedEventEnd ? nav.domContentLoadedEventEnd : null,
+    load: nav && nav.loadEventEnd ? nav.loadEventEnd : null,
+    lcp: lcpEntries && lcpEntries.length ? lcpEntries[lcpEntries.length - 1].startTime : null,
+    cls: shiftEntries === null ? null : shiftEntries.reduce(function (total, entry) {
+        return entry.hadRecentInput ? total : total + entry.value;
+    }, 0),
+    resource_count: resources.length,
+    transfer_bytes: transferBytes
+};
+"""
+
 
 class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
     @classmethod
@@ -46,7 +411,10 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
     def setUp(self):
         self._instance_drivers = []
         self._drivers_visited_pages = set()
+        self._blocked_request_counts = {}
         super().setUp()
+        # Requests blocked in earlier tests
+        self._take_blocked_request_count(self._driver)
         self._fix_window_size()
         self._driver.delete_all_cookies()
 
@@ -66,14 +434,82 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         """
         if wait:
             self.wait_until_loaded(css_selector=within)
-        return self._assertTextPresent(text, PyQuery(self._get_page_source(), parser="html"), within)
+        norm_text = html_norm(escape(text))
+        results = self._search_texts({within: [text]})
+        if results is None:
+            return self._assertTextPresent(text, self._get_parsed_page_source(), within)
+        count, [(found, snippet)] = results[within]
+        if count == 0:
+            self.fail(f"No elements matched the CSS selector {within!r}")
+        elif count == 1:
+            # Better error message for the common case:
+            if not found:
+                self.fail(f"{norm_text!r} not found in {snippet!r}")
+        else:
+            self.assertTrue(found, f"Didn't find {text!r} inside any of the {count} matching elements for {within!r}")
 
     def assertTextAbsent(self, text, within="body"):
         """
         Asserts that the text is not present within the body of the current page,
         or within any element matching the CSS selector passed as `within`.
         """
-        return self._assertTextAbsent(text, PyQuery(self._get_page_source(), parser="html"), within)
+        norm_text = html_norm(escape(text))
+        results = self._search_texts({within: [text]})
+        if results is None:
+            return self._assertTextAbsent(text, self._get_parsed_page_source(), within)
+        count, [(found, snippet)] = results[within]
+        if count == 1:
+            # Better error message for the common case:
+            if found:
+                self.fail(f"{norm_text!r} unexpectedly found in {snippet!r}")
+        else:
+            self.assertFalse(found, f"Didn't find {text!r} inside any of the {count} matching_elements for {within!r}")
+
+    def assertTextsPresent(self, texts, within="body", wait=True):
+        """
+        Asserts that each of the texts is present within the body of the current page,
+        or within an element matching the CSS selector passed as `within`. Items in
+        `texts` can also be `(text, within)` tuples. All missing texts are reported
+        in a single failure.
+        """
+        grouped = group_texts_by_selector(texts, within)
+        if wait:
+            for selector in grouped:
+                self.wait_until_loaded(css_selector=selector)
+        results = self._search_texts(grouped)
+        if results is None:
+            return self._assertTextsPresent(texts, self._get_parsed_page_source(), within)
+        problems = []
+        for selector, selector_texts in grouped.items():
+            count, found_list = results[selector]
+            if count == 0:
+                problems.append(f"No elements matched the CSS selector {selector!r}")
+                continue
+            for text, (found, _) in zip(selector_texts, found_list):
+                if not found:
+                    problems.append(f"Didn't find {text!r} inside {selector!r}")
+        if problems:
+            self.fail("\n".join(problems))
+
+    def assertTextsAbsent(self, texts, within="body"):
+        """
+        Asserts that none of the texts are present within the body of the current page,
+        or within any element matching the CSS selector passed as `within`. Items in
+        `texts` can also be `(text, within)` tuples. All texts found are reported
+        in a single failure.
+        """
+        grouped = group_texts_by_selector(texts, within)
+        results = self._search_texts(grouped)
+        if results is None:
+            return self._assertTextsAbsent(texts, self._get_parsed_page_source(), within)
+        problems = []
+        for selector, selector_texts in grouped.items():
+            _, found_list = results[selector]
+            for text, (found, _) in zip(selector_texts, found_list):
+                if found:
+                    problems.append(f"Found {text!r} inside {selector!r}")
+        if problems:
+            self.fail("\n".join(problems))
 
     def back(self):
         """
@@ -92,14 +528,15 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         """
         Follows the link specified by CSS in css_selector= or matching the text in text=
         """
-        if css_selector is not None and text is not None:
-            raise ValueError("pass only one of text= or css_selector= to follow_link")
-        elif css_selector is not None:
-            return self.click(css_selector=css_selector, wait_for_reload=True)
-        elif text is not None:
-            return self.click(link_text=text, wait_for_reload=True)
-        else:
-            raise ValueError("follow_link requires either a text= or css_selector= argument")
+        with self._record_action("follow_link", css_selector if text is None else text):
+            if css_selector is not None and text is not None:
+                raise ValueError("pass only one of text= or css_selector= to follow_link")
+            elif css_selector is not None:
+                return self.click(css_selector=css_selector, wait_for_reload=True)
+            elif text is not None:
+                return self.click(link_text=text, wait_for_reload=True)
+            else:
+                raise ValueError("follow_link requires either a text= or css_selector= argument")
 
     def fill(self, fields, scroll=NotPassed):
         """
@@ -108,7 +545,13 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         """
         if scroll is NotPassed:
             scroll = self.auto_scroll_by_default
-        for k, v in fields.items():
+        items = list(fields.items())
+        while items:
+            if self.fast_fill:
+                items = items[self._fast_fill(items) :]
+                if not items:
+                    break
+            k, v = items.pop(0)
             e = self._find_with_timeout(css_selector=k)
             self._fill_input(e, v, scroll=scroll)
 
@@ -127,6 +570,16 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         Returns the value of the attribute of the element matching the css_selector,
         or None if there is no such element or attribute.
         """
+        # Like get_dom_attribute, the snapshot has the HTML attribute, not the
+        # property e.g. the initial value of an input, not what's been typed.
+        elems = self._select_from_snapshot(css_selector)
+        if elems is not None:
+            if not elems:
+                return None
+            value = elems[0].get(attribute.lower())
+            if value is not None and attribute.lower() in _BOOLEAN_ATTRIBUTES:
+                return "true"
+            return value
         try:
             element = self._find(css_selector=css_selector)
         except NoSuchElementException:
@@ -138,6 +591,8 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         Returns the "inner text" (innerText in JS) of the element matching
         the css_selector, or None if there is none.
         """
+        # Always asks the browser, even with `dom_snapshots`, as innerText
+        # depends on layout and CSS, which the snapshot doesn't have.
         try:
             element = self._find(css_selector=css_selector)
         except NoSuchElementException:
@@ -148,23 +603,30 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         """
         Gets the named URL, passing *args and **kwargs to Django's URL 'reverse' function.
         """
-        kwargs.pop("expect_errors", None)
-        self.get_literal_url(reverse(name, args=args, kwargs=kwargs))
+        with self._record_action("get_url", name):
+            kwargs.pop("expect_errors", None)
+            self.get_literal_url(reverse(name, args=args, kwargs=kwargs))
 
     def get_literal_url(self, url, auto_follow=None, expect_errors=None):
         """
         Gets the passed in URL, as a literal relative URL, without using reverse.
         """
-        if not url.startswith(self.live_server_url):
-            url = self.live_server_url + url
-        self._get_url_raw(url)
-        self._wait_until_finished()
+        with self._record_action("get_literal_url", url) as action:
+            if not url.startswith(self.live_server_url):
+                url = self.live_server_url + url
+            self._get_url_raw(url)
+            document_size = self._wait_until_finished()
+            if action is not None:
+                action.bytes = document_size
 
     def is_element_present(self, css_selector):
         """
         Returns True if the element specified by the CSS selector is present on the current page,
         False otherwise.
         """
+        elems = self._select_from_snapshot(css_selector)
+        if elems is not None:
+            return len(elems) > 0
         try:
             self._find(css_selector)
         except NoSuchElementException:
@@ -188,15 +650,13 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         """
         Set a dictionary of items directly into the Django session.
         """
-        # Cookies don't work unless we visit a page first
-        if not self._have_visited_page():
-            self.get_url("django_functest.emptypage")
-
-        session = self._get_session()
-        for name, value in item_dict.items():
-            session[name] = str(value)
-        session.save()
-        self._update_session_cookie(session)  # Required for signed_cookie backend
+        in_transaction = self._session_in_transaction is not None
+        with self.session_transaction() as session:
+            for name, value in item_dict.items():
+                session[name] = str(value)
+        if in_transaction:
+            # Saved at the end of the outermost transaction
+            return
 
         s2 = self._get_session()
         if all(s2.get(name) == str(value) for name, value in item_dict.items()):
@@ -204,32 +664,46 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
 
         raise RuntimeError("Session not saved correctly")
 
+    def session_transaction(self):
+        """
+        Returns a context manager that yields the Django session, for making
+        several changes to it at once. Changes made inside the block (including
+        by ``set_session_data`` and ``shortcut_login``) are saved once at the
+        end of the block, and discarded if an exception is raised.
+        """
+        # Cookies don't work unless we visit a page first
+        if not self._have_visited_page():
+            self.get_url("django_functest.emptypage")
+        return self._session_transaction()
+
     def submit(self, css_selector, wait_for_reload=True, auto_follow=None, window_closes=False, scroll=NotPassed):
         """
         Submit the form. css_selector should refer to a form, or a button/input to use
         to submit the form.
         """
-        if scroll is NotPassed:
-            scroll = self.auto_scroll_by_default
-        self.click(
-            css_selector,
-            wait_for_reload=wait_for_reload,
-            window_closes=window_closes,
-            _expect_form=True,
-            scroll=scroll,
-        )
+        with self._record_action("submit", css_selector):
+            if scroll is NotPassed:
+                scroll = self.auto_scroll_by_default
+            self.click(
+                css_selector,
+                wait_for_reload=wait_for_reload,
+                window_closes=window_closes,
+                _expect_form=True,
+                scroll=scroll,
+            )
 
     def value(self, css_selector):
         """
         Returns the value of the form input specified in the CSS selector
         """
         elem = self._find(css_selector=css_selector)
-        if elem.tag_name == "input" and elem.get_attribute("type") == "checkbox":
-            return self._is_checked(elem)
-        elif elem.tag_name == "input" and elem.get_attribute("type") == "radio":
-            return self._get_radio_button_value(elem)
+        description = self._describe_element(elem)
+        if description["tag"] == "input" and description["type"] == "checkbox":
+            return description["checked"]
+        elif description["tag"] == "input" and description["type"] == "radio":
+            return self._get_radio_button_value(elem, description=description)
         else:
-            return elem.get_attribute("value")
+            return description["value"]
 
     # Full browser specific:
 
@@ -248,6 +722,20 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
 
     scroll_method = "auto"
 
+    fast_fill = False  # fill fields using a single script, instead of typing
+
+    fast_fill_exclude = None  # CSS selector for fields to always fill by typing
+
+    dom_snapshots = False  # answer reads from a parsed copy of the page, kept until the DOM changes
+
+    blocked_url_patterns = ()  # URL patterns, with * wildcards, for requests the browser shouldn't make
+
+    resource_type_blocklist = ()  # types of resource not to load, e.g. ["font", "image"]
+
+    _dom_snapshot = None
+
+    _page_state = None
+
     def get_browser_window_size(self):
         """
         Configuration method: returns the desired browser window height that
@@ -272,6 +760,22 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         """
         return cls.default_timeout
 
+    @classmethod
+    def get_blocked_url_patterns(cls):
+        """
+        Configuration classmethod: returns the URL patterns for requests that
+        the browser should block. Defaults to ``blocked_url_patterns``, plus
+        patterns for the file extensions of ``resource_type_blocklist`` types.
+        """
+        patterns = list(cls.blocked_url_patterns)
+        unknown = set(cls.resource_type_blocklist) - set(_RESOURCE_TYPE_EXTENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown resource types: {', '.join(sorted(unknown))}")
+        for resource_type in cls.resource_type_blocklist:
+            for extension in _RESOURCE_TYPE_EXTENSIONS[resource_type]:
+                patterns.extend([f"*.{extension}", f"*.{extension}?*"])
+        return patterns
+
     @classmethod
     def get_driver_name(cls):
         """
@@ -316,49 +820,48 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         Clicks the button or control specified by the CSS selector
         or xpath.
         """
-        # (Also used internally to submit forms)
+        with self._record_action("click", css_selector or xpath or text or link_text) as action:
+            # (Also used internally to submit forms)
 
-        if window_closes:
-            wait_for_reload = False
-        if wait_for_reload:
-            self._driver.execute_script("document.pageReloadedYetFlag='notyet';")
+            if window_closes:
+                wait_for_reload = False
 
-        elem = self._find_with_timeout(
-            css_selector=css_selector,
-            xpath=xpath,
-            text=text,
-            text_parent_id=text_parent_id,
-            link_text=link_text,
-            timeout=wait_timeout,
-        )
-        if _expect_form and elem.tag_name == "form":
-            elem.submit()
-        else:
-            if scroll:
-                self._scroll_into_view(elem)
-            elem.click()
-            if double:
+            elem = self._find_with_timeout(
+                css_selector=css_selector,
+                xpath=xpath,
+                text=text,
+                text_parent_id=text_parent_id,
+                link_text=link_text,
+                timeout=wait_timeout,
+            )
+            if wait_for_reload:
+                # Set once the element is found, so that a failed lookup doesn't
+                # leave it behind for a later wait.
+                self._driver.execute_script("document.pageReloadedYetFlag='notyet';")
+            if _expect_form and elem.tag_name == "form":
+                elem.submit()
+            else:
+                if scroll:
+                    self._scroll_into_view(elem)
+                elem.click()
+                if double:
+                    try:
+                        elem.click()
+                    except StaleElementReferenceException:
+                        pass
+
+            if wait_for_reload:
+                # Checked here rather than left to wait_for_page_load, which
+                # subclasses may override.
                 try:
-                    elem.click()
-                except StaleElementReferenceException:
+                    self._wait_for_page(check_loaded=False)
+                except NoSuchWindowException:
+                    # legitimate sometimes e.g. when window closes
                     pass
-
-        if wait_for_reload:
-
-            def f(driver):
-                obj = driver.execute_script("return document.pageReloadedYetFlag;")
-
-                if obj is None or obj != "notyet":
-                    return True
-                return False
-
-            try:
-                WebDriverWait(self._driver, self.get_default_timeout()).until(f)
-            except NoSuchWindowException:
-                # legitimate sometimes e.g. when window closes
-                pass
-        if not window_closes and not expect_alert:
-            self._wait_until_finished()
+            if not window_closes and not expect_alert:
+                document_size = self._wait_until_finished()
+                if wait_for_reload and action is not None:
+                    action.bytes = document_size
 
     def accept_alert(self):
         """
@@ -378,6 +881,41 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         """
         return self._driver.execute_script(script, *args)
 
+    def get_page_metrics(self):
+        """
+        Returns a dictionary of performance metrics for the current page, from
+        the browser's Performance APIs.
+        """
+        return self._driver.execute_script(_PAGE_METRICS_SCRIPT)
+
+    def assertPageMetricsWithin(self, **budgets):
+        """
+        Asserts that the performance metrics for the current page, as returned
+        by ``get_page_metrics``, are no more than the values passed as keyword
+        arguments.
+        """
+        metrics = self.get_page_metrics()
+        unknown = set(budgets) - set(metrics)
+        if unknown:
+            raise ValueError(f"Unknown page metrics: {', '.join(sorted(unknown))}")
+        problems = [
+            f"{name} is {metrics[name]}, more than {budget}"
+            for name, budget in budgets.items()
+            # Metrics that the browser doesn't support are None
+            if metrics[name] is not None and metrics[name] > budget
+        ]
+        if problems:
+            self.fail(f"Page metrics for {self.current_url} are over budget:\n" + "\n".join(problems))
+
+    def get_blocked_request_counts(self):
+        """
+        Returns a dictionary of page URL to the number of requests that the
+        browser blocked while on that page, because of ``blocked_url_patterns``
+        or ``resource_type_blocklist``.
+        """
+        self._count_blocked_requests()
+        return dict(self._blocked_request_counts)
+
     def hover(self, css_selector):
         """
         Peform a mouse hover over the element specified by the CSS selector.
@@ -489,8 +1027,7 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         """
         Waits until the page has finished loading
         """
-        self.wait_until_loaded("body")
-        self._wait_for_document_ready()
+        self._wait_for_page()
 
     def wait_until(self, callback, timeout=None):
         """
@@ -530,9 +1067,8 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
     # Semi-public (used by mixins)
 
     def flush_session(self):
-        session = self._get_session()
-        session.flush()
-        self._update_session_cookie(session)  # Required for signed_cookie backend
+        with self._session_transaction() as session:
+            session.flush()
 
     # Implementation methods - private
 
@@ -540,26 +1076,94 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
     def _create_browser_instance(cls):
         driver_name = cls.get_driver_name()
         kwargs = cls.get_webdriver_options()
-        if not cls.display_browser_window():
+        blocked_url_patterns = cls.get_blocked_url_patterns()
+        if not cls.display_browser_window() or blocked_url_patterns:
             if "options" in kwargs:
                 options = kwargs["options"]
             else:
                 options = cls._create_browser_options(driver_name)
-            if hasattr(options, "headless"):
-                options.headless = True
-            else:
-                if isinstance(options, webdriver.ChromeOptions):
-                    options.add_argument("--headless=new")
-                elif isinstance(options, webdriver.FirefoxOptions):
-                    options.add_argument("--headless")
+            if not cls.display_browser_window():
+                if hasattr(options, "headless"):
+                    options.headless = True
                 else:
-                    logger.warning(f"Cannot set headless mode for webdriver {driver_name}")
+                    if isinstance(options, webdriver.ChromeOptions):
+                        options.add_argument("--headless=new")
+                    elif isinstance(options, webdriver.FirefoxOptions):
+                        options.add_argument("--headless")
+                    else:
+                        logger.warning(f"Cannot set headless mode for webdriver {driver_name}")
+            if blocked_url_patterns:
+                if isinstance(options, webdriver.FirefoxOptions):
+                    # Requests are blocked using WebDriver BiDi
+                    options.set_capability("webSocketUrl", True)
+                elif isinstance(options, webdriver.ChromeOptions):
+                    # Blocked requests are counted from the performance log
+                    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
             if options is not None:
                 kwargs["options"] = options
         driver = getattr(webdriver, driver_name)(**kwargs)
         driver.set_page_load_timeout(cls.get_page_load_timeout())
+        if blocked_url_patterns:
+            cls._block_requests(driver, blocked_url_patterns)
         return driver
 
+    @classmethod
+    def _block_requests(cls, driver, patterns):
+        if isinstance(driver, webdriver.Chrome):
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        elif isinstance(driver, webdriver.Firefox):
+            if not hasattr(getattr(driver, "network", None), "add_request_handler"):
+                # Request interception with WebDriver BiDi is only in recent
+                # versions of Selenium.
+                logger.warning("Cannot block requests for Firefox with this version of Selenium")
+                return
+            blocked_url_re = _url_patterns_regex(patterns)
+            blocked = _bidi_blocked_requests[driver] = []
+            # If the patterns can be given to the browser, only requests that
+            # might be blocked are intercepted. Otherwise every request is,
+            # including the page itself.
+            bidi_url_patterns = _bidi_url_patterns(patterns)
+            kwargs = {"url_patterns": bidi_url_patterns} if bidi_url_patterns else {}
+
+            def handle_request(request):
+                if blocked_url_re.match(request.url):
+                    blocked.append(request.url)
+                    request.fail()
+                else:
+                    request.continue_request()
+
+            driver.network.add_request_handler("before_request", handle_request, **kwargs)
+        else:
+            logger.warning(f"Cannot block requests for webdriver {cls.get_driver_name()}")
+
+    def _take_blocked_request_count(self, driver):
+        # Returns the number of requests blocked since the last call.
+        if not self.get_blocked_url_patterns():
+            return 0
+        if driver in _bidi_blocked_requests:
+            blocked = _bidi_blocked_requests[driver]
+            count = len(blocked)
+            del blocked[:count]
+            return count
+        if isinstance(driver, webdriver.Chrome):
+            count = 0
+            for entry in driver.get_log("performance"):
+                message = json.loads(entry["message"])["message"]
+                if message["method"] != "Network.loadingFailed":
+                    continue
+                # "inspector" is the reason given for Network.setBlockedURLs
+                if message["params"].get("blockedReason") == "inspector":
+                    count += 1
+            return count
+        return 0
+
+    def _count_blocked_requests(self):
+        count = self._take_blocked_request_count(self._driver)
+        if count:
+            url = self.current_url
+            self._blocked_request_counts[url] = self._blocked_request_counts.get(url, 0) + count
+
     @classmethod
     def _create_browser_options(cls, driver_name):
         opt_classes = {
@@ -622,15 +1226,11 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
     def _have_visited_page(self):
         return self._driver in self._drivers_visited_pages
 
-    def _get_session(self):
+    def _get_session_key(self):
         session_cookie = self._driver.get_cookie(settings.SESSION_COOKIE_NAME)
         if session_cookie is None:
-            # Create new
-            session = get_session_store()
-            self._update_session_cookie(session)
-        else:
-            session = get_session_store(session_key=session_cookie["value"])
-        return session
+            return None
+        return session_cookie["value"]
 
     def _update_session_cookie(self, session):
         cookie_data = {
@@ -648,39 +1248,166 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         else:
             self._driver.add_cookie(cookie_data)
 
+    def _get_checkpoint_state(self):
+        if not self._have_visited_page():
+            return {"cookies": [], "url": None}
+        cookies = [cookie for cookie in self._driver.get_cookies() if cookie["name"] != settings.SESSION_COOKIE_NAME]
+        # Relative URL, to be used with get_literal_url
+        url = urlunsplit(urlsplit(self.current_url)._replace(scheme="", netloc=""))
+        return {"cookies": cookies, "url": url}
+
+    def _restore_checkpoint_state(self, state, session_data):
+        # Cookies don't work unless we visit a page first
+        if not self._have_visited_page():
+            self.get_url("django_functest.emptypage")
+        self._driver.delete_all_cookies()
+        for cookie in state["cookies"]:
+            self._driver.add_cookie(cookie)
+        self._restore_checkpoint_session_data(session_data)
+        if state["url"] is not None:
+            self.get_literal_url(state["url"])
+
+    def _get_action_request_thread(self):
+        # Requests are handled by the live server threads
+        return None
+
     def _get_window_size(self):
         if self._driver.name == "phantomjs":
             return self.execute_script("return [document.width, document.height]")
         else:
             return self.execute_script("return [window.outerWidth, window.outerHeight]")
 
-    def _wait_for_document_ready(self):
-        self.wait_until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+    def _wait_for_page(self, check_loaded=True):
+        # Waits for any reload started by `click`, and for the page to load,
+        # usually with a single round trip to the browser. Returns a dictionary
+        # with the `size` of the document, which is also kept for the action log.
+        self._page_state = self._wait_for_async_script(
+            _WAIT_FOR_PAGE_SCRIPT,
+            lambda driver: driver.execute_script(_PAGE_READY_SCRIPT, check_loaded),
+            script_args=(check_loaded,),
+        )
+        return self._page_state
+
+    def _wait_for_async_script(self, script, fallback_callback, timeout=None, script_args=()):
+        # Waits for one of the _WAIT_FOR_* scripts to report that the browser
+        # event it listens for has happened, with as few round trips as
+        # possible. If the driver can't do this, falls back to polling
+        # `fallback_callback`. Returns the first true value from either.
+        if timeout is None:
+            timeout = self.get_default_timeout()
+        end = time.monotonic() + timeout
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutException(f"Timed out after {timeout}s waiting for the browser")
+            try:
+                # Short enough to be within the driver's script timeout
+                result = self._driver.execute_async_script(script, int(min(remaining, 5) * 1000), *script_args)
+                if result:
+                    return result
+            except (NoSuchWindowException, UnexpectedAlertPresentException):
+                raise
+            except JavascriptException:
+                # The document was unloaded while the script was running,
+                # which is what we are often waiting for. Check the new one.
+                continue
+            except WebDriverException:
+                logger.debug("Waiting with execute_async_script failed, falling back to polling", exc_info=True)
+                return self._poll_until(fallback_callback, end - time.monotonic())
+
+    def _poll_until(self, callback, timeout):
+        # Most pages load quickly, so poll often at first, then back off.
+        end = time.monotonic() + timeout
+        interval = 0.01
+        while True:
+            result = callback(self._driver)
+            if result:
+                return result
+            if time.monotonic() >= end:
+                raise TimeoutException(f"Timed out after {timeout:.1f}s waiting for the browser")
+            time.sleep(interval)
+            interval = min(interval * 2, 0.5)
 
     def _wait_until_finished(self):
+        # Returns the size of the document, for the action log, or 0 if
+        # `wait_for_page_load` has been overridden and didn't report it.
+        self._page_state = None
         try:
             self.wait_for_page_load()
+            self._count_blocked_requests()
         except NoSuchWindowException:
-            pass  # window can legitimately close e.g. for popups
+            return 0  # window can legitimately close e.g. for popups
+        state = self._page_state
+        return state["size"] if isinstance(state, dict) else 0
+
+    def _search_texts(self, texts_by_selector):
+        # Searches for texts in the browser, without fetching the page source.
+        # Returns a dictionary of selector to (number of matching elements,
+        # list of (found, snippet) for each text), or None if the browser can't
+        # use one of the selectors, e.g. PyQuery's `:contains`. With
+        # `dom_snapshots`, it's quicker to search the snapshot.
+        if self.dom_snapshots:
+            return None
+        queries = [
+            [selector, [html_norm(escape(text)) for text in texts]] for selector, texts in texts_by_selector.items()
+        ]
+        results = self._driver.execute_script(_SEARCH_TEXTS_SCRIPT, queries)
+        if results is None:
+            return None
+        return {selector: (count, found_list) for selector, (count, found_list) in zip(texts_by_selector, results)}
 
     def _get_page_source(self):
         return self._driver.page_source
 
+    def _get_parsed_page_source(self):
+        if self.dom_snapshots:
+            return self._get_dom_snapshot()
+        source = self._get_page_source()
+        return ParsedDocument(PyQuery(source, parser="html"), size=len(source))
+
+    def _get_dom_snapshot(self):
+        # Returns a ParsedDocument for the current page, re-using the last one
+        # if the DOM hasn't changed since.
+        known_version = None if self._dom_snapshot is None else self._dom_snapshot[0]
+        version, source = self._driver.execute_script(_DOM_SNAPSHOT_SCRIPT, known_version)
+        if source is None:
+            return self._dom_snapshot[1]
+        document = ParsedDocument(PyQuery(source, parser="html"), size=len(source))
+        self._dom_snapshot = (version, document)
+        return document
+
+    def _select_from_snapshot(self, css_selector):
+        # Returns the elements matching the selector in the DOM snapshot, or
+        # None if the snapshot can't be used. Selectors with pseudo-classes
+        # are left to the browser, since some (e.g. `:focus`, `:checked`)
+        # depend on state that isn't in the HTML.
+        if not self.dom_snapshots or not isinstance(css_selector, str) or ":" in css_selector:
+            return None
+        try:
+            return self._get_dom_snapshot().select(css_selector)
+        except SelectorError:
+            return None
+
     def _fill_input(self, elem, val, scroll=True):
-        if elem.tag_name == "select":
-            self._set_select_elem(elem, val, scroll=scroll)
-        elif elem.tag_name == "input" and elem.get_attribute("type") == "checkbox":
-            self._set_check_box(elem, val, scroll=scroll)
-        elif elem.tag_name == "input" and elem.get_attribute("type") == "radio":
-            self._set_radio_button(elem, val, scroll=scroll)
-        elif elem.tag_name == "input" and elem.get_attribute("type") == "file":
+        description = self._describe_element(elem)
+        tag, input_type = description["tag"], description["type"]
+        if tag == "select":
+            self._set_select_elem(elem, val, scroll=scroll and description["visible"])
+        elif tag == "input" and input_type == "checkbox":
+            self._set_check_box(elem, val, scroll=scroll, description=description)
+        elif tag == "input" and input_type == "radio":
+            self._set_radio_button(elem, val, scroll=scroll, description=description)
+        elif tag == "input" and input_type == "file":
             # val is an Upload instance
             fname = self._make_temp_file_for_upload(val)
             elem.send_keys(fname)
         else:
-            if scroll:
+            # Scrolling can't make hidden elements usable, and with some scroll
+            # methods would wait until timing out. Selenium raises a better
+            # error when they are used.
+            if scroll and description["visible"]:
                 self._scroll_into_view(elem)
-            if elem.get_attribute("value"):
+            if description["value"]:
                 # We avoid 'elem.clear()' as it fires events unhelpfully.
                 # Alternative methods from:
                 # https://stackoverflow.com/questions/7732125/clear-text-from-textarea-with-selenium
@@ -700,6 +1427,20 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
 
             elem.send_keys(self._normalize_linebreaks(val))
 
+    def _fast_fill(self, items):
+        # Fills as many of the (selector, value) items as possible with one
+        # script, and returns how many were done. The next one, if any, needs
+        # to be filled by `_fill_input`.
+        fields = []
+        for css_selector, value in items:
+            if isinstance(value, Upload):
+                break
+            selectors = [css_selector] if isinstance(css_selector, str) else list(css_selector)
+            fields.append([selectors, self._normalize_linebreaks(value)])
+        if not fields:
+            return 0
+        return self._driver.execute_script(_FAST_FILL_SCRIPT, fields, self.fast_fill_exclude)
+
     def _fill_input_by_text(self, elem, val, scroll=True):
         if elem.tag_name == "select":
             self._set_select_elem_by_text(elem, val, scroll=scroll)
@@ -839,38 +1580,44 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
             elem,
         )
 
-    def _is_checked(self, elem):
-        return elem.get_attribute("checked") == "true"
+    def _describe_element(self, elem):
+        return self._driver.execute_script(_DESCRIBE_ELEMENT_SCRIPT, elem)
 
-    def _set_check_box(self, elem, state, scroll=True):
-        if self._is_checked(elem) != state:
-            if scroll:
+    def _set_check_box(self, elem, state, scroll=True, description=None):
+        if description is None:
+            description = self._describe_element(elem)
+        if description["checked"] != state:
+            if scroll and description["visible"]:
                 self._scroll_into_view(elem)
             elem.click()
 
-    def _set_radio_button(self, elem, value, scroll=True):
+    def _set_radio_button(self, elem, value, scroll=True, description=None):
         # The 'elem' found might be one of several (previous Selenium code will have
         # returned the first one that matched, especially if a 'name' selector was
         # used). We need to find the actual one that is has the correct value.
         # We also need to be aware of multiple forms that might be on the page.
-        form_elem = elem.find_element(By.XPATH, "./ancestor::form")
-        name = elem.get_attribute("name")
-        correct_elem = form_elem.find_element(By.XPATH, f'//input[@type="radio"][@name="{name}"][@value="{value}"]')
-        if not self._is_checked(correct_elem):
-            if scroll:
-                self._scroll_into_view(correct_elem)
-            correct_elem.click()
-
-    def _get_radio_button_value(self, elem):
+        if description is None:
+            description = self._describe_element(elem)
+        value = str(value)
+        for radio in description["radios"]:
+            if radio["value"] == value:
+                break
+        else:
+            raise NoSuchElementException(f"No radio button with value {value!r}")
+        if not radio["checked"]:
+            if scroll and radio["visible"]:
+                self._scroll_into_view(radio["element"])
+            radio["element"].click()
+
+    def _get_radio_button_value(self, elem, description=None):
         # The 'elem' found might be one of several (previous Selenium code will have
         # returned the first one that matched, especially if a 'name' selector was
         # used). We need to find the actual one that is set.
-        form_elem = elem.find_element(By.XPATH, "./ancestor::form")
-        name = elem.get_attribute("name")
-        elems = form_elem.find_elements(By.XPATH, f'//input[@type="radio"][@name="{name}"]')
-        for e in elems:
-            if e.get_attribute("checked"):
-                return e.get_attribute("value")
+        if description is None:
+            description = self._describe_element(elem)
+        for radio in description["radios"]:
+            if radio["checked"]:
+                return radio["value"]
 
     def _set_select_elem(self, elem, value, scroll=True):
         if scroll:
@@ -895,6 +1642,29 @@ class FuncSeleniumMixin(CommonMixin, FuncBaseMixin):
         return text
 
 
+def _url_patterns_regex(patterns):
+    # Matches URLs like Chrome's Network.setBlockedURLs: `*` matches anything.
+    return re.compile("|".join("(?:" + ".*".join(map(re.escape, pattern.split("*"))) + ")$" for pattern in patterns))
+
+
+def _bidi_url_patterns(patterns):
+    # Converts patterns for `_url_patterns_regex` to WebDriver BiDi URL
+    # patterns that match at least the same URLs, or returns None if that
+    # isn't possible. BiDi patterns have no wildcards within a part of the URL,
+    # so only exact URLs and whole sites (e.g. "https://example.com/*") can be
+    # converted.
+    bidi_patterns = []
+    for pattern in patterns:
+        if "*" not in pattern:
+            bidi_patterns.append({"type": "string", "pattern": pattern})
+            continue
+        m = _BIDI_SITE_PATTERN_RE.match(pattern)
+        if m is None:
+            return None
+        bidi_patterns.append({"type": "pattern", "protocol": m.group("protocol"), "hostname": m.group("hostname")})
+    return bidi_patterns
+
+
 def _get_shadow_root(element):
     # Workaround the fact that `element.shadow_root` throws assertion error for Firefox.
     # (finding elements still doesn't work at time of writing, but we don't want to wait
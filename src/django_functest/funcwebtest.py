@@ -1,14 +1,23 @@
+import copy
+import threading
+import time
 import urllib
 from collections import defaultdict
 
 from django.conf import settings
+from django.utils.html import escape
 from django_webtest import WebTestMixin
 from pyquery.pyquery import PyQuery
 from webtest.forms import Checkbox
 
 from .base import FuncBaseMixin
+from .cache import ParseCache
+from .concurrency import CrowdResult, record_requests, run_concurrently, serialize_requests
+from .crawler import crawl
+from .dom import ParsedDocument, stream_search
 from .exceptions import WebTestCantUseElement, WebTestMultipleElementsException, WebTestNoSuchElementException
-from .utils import BrowserSessionToken, CommonMixin, NotPassed, get_session_store
+from .subresources import extract_subresource_urls, fetch_subresources
+from .utils import BrowserSessionToken, CommonMixin, NotPassed, html_norm
 
 try:
     from django.urls import reverse
@@ -21,6 +30,9 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         super().__init__(*args, **kwargs)
         self._all_last_responses = defaultdict(list)
         self._all_apps = []
+        self.parse_cache = ParseCache(max_entries=self.parse_cache_size, max_bytes=self.parse_cache_max_bytes)
+        # URL -> SubresourceResult, see get_subresources
+        self._subresource_results = {}
 
     # Public Common API
     def assertTextAbsent(self, text, within="body"):
@@ -28,14 +40,34 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         Asserts that the text is not present within the body of the current page,
         or within any element matching the CSS selector passed as `within`.
         """
-        self._assertTextAbsent(text, self._make_pq(self.last_response), within)
+        self._assertTextAbsent(text, self._get_parsed_document(self.last_response), within)
 
     def assertTextPresent(self, text, within="body", wait=True):
         """
         Asserts that the text is present within the body of the current page,
         or within an element matching the CSS selector passed as `within`.
         """
-        self._assertTextPresent(text, self._make_pq(self.last_response), within)
+        if self._stream_search(self.last_response, text, within):
+            return
+        self._assertTextPresent(text, self._get_parsed_document(self.last_response), within)
+
+    def assertTextsPresent(self, texts, within="body", wait=True):
+        """
+        Asserts that each of the texts is present within the body of the current page,
+        or within an element matching the CSS selector passed as `within`. Items in
+        `texts` can also be `(text, within)` tuples. All missing texts are reported
+        in a single failure.
+        """
+        self._assertTextsPresent(texts, self._get_parsed_document(self.last_response), within)
+
+    def assertTextsAbsent(self, texts, within="body"):
+        """
+        Asserts that none of the texts are present within the body of the current page,
+        or within any element matching the CSS selector passed as `within`. Items in
+        `texts` can also be `(text, within)` tuples. All texts found are reported
+        in a single failure.
+        """
+        self._assertTextsAbsent(texts, self._get_parsed_document(self.last_response), within)
 
     def back(self):
         """
@@ -57,7 +89,7 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         if css_selector is not None and text is not None:
             raise ValueError("pass only one of text= or css_selector= to follow_link")
         elif css_selector is not None:
-            elems = self._make_pq(self.last_response).find(css_selector)
+            elems = self._find_by_css_selector(self.last_response, css_selector)
             if len(elems) == 0:
                 raise WebTestNoSuchElementException(f"Can't find element matching '{css_selector}'")
         elif text is not None:
@@ -66,7 +98,7 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
             escaped_text = text.replace('"', '\\"')
             css_expr = f'a:contains("{escaped_text}")'
 
-            elems = self._make_pq(self.last_response).find(css_expr)
+            elems = self._find_by_css_selector(self.last_response, css_expr)
 
             if len(elems) == 0:
                 raise WebTestNoSuchElementException(f"Can't find a link with the text '{text}'")
@@ -86,15 +118,16 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
                 f"Different href values for links '{css_selector}': '{' ,'.join(hrefs)}'"
             )
         final_url = urllib.parse.urljoin(self.current_url, hrefs[0])
-        self.get_literal_url(final_url)
+        with self._record_action("follow_link", css_selector if text is None else text):
+            self.get_literal_url(final_url)
 
     def fill(self, data, scroll=NotPassed):
         """
         Fills form inputs using the values in fields, which is a dictionary
         of CSS selectors to values.
         """
-        for selector, value in data.items():
-            form, field_name, elem = self._find_form_and_field_by_css_selector(self.last_response, selector)
+        found = self._find_forms_and_fields_by_css_selectors(self.last_response, data.keys())
+        for (form, field_name, elem), value in zip(found, data.values()):
             field_items = form.fields[field_name]
             if isinstance(field_items, list) and len(field_items) > 1:
                 # We've got something like a set of checkboxes with the same name.
@@ -109,8 +142,8 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         """
         Same as ``fill`` except the values are text captions. Useful for ``select`` elements.
         """
-        for selector, text in fields.items():
-            form, field_name, _ = self._find_form_and_field_by_css_selector(self.last_response, selector)
+        found = self._find_forms_and_fields_by_css_selectors(self.last_response, fields.keys())
+        for (form, field_name, _), text in zip(found, fields.values()):
             self._fill_field_by_text(form, field_name, text)
 
     def get_element_attribute(self, css_selector, attribute):
@@ -118,7 +151,7 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         Returns the value of the attribute of the element matching the css_selector,
         or None if there is no such element or attribute.
         """
-        elems = self._make_pq(self.last_response).find(css_selector)
+        elems = self._find_by_css_selector(self.last_response, css_selector)
         if len(elems) == 0:
             return None
         if len(elems) > 1:
@@ -130,7 +163,7 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         Returns the "inner text" (innerText in JS) of the element matching
         the css_selector, or None if there is none.
         """
-        elems = self._make_pq(self.last_response).find(css_selector)
+        elems = self._find_by_css_selector(self.last_response, css_selector)
         if len(elems) == 0:
             return None
         if len(elems) > 1:
@@ -141,20 +174,22 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         """
         Gets the named URL, passing *args and **kwargs to Django's URL 'reverse' function.
         """
-        return self.get_literal_url(reverse(name, args=args, kwargs=kwargs))
+        with self._record_action("get_url", name):
+            return self.get_literal_url(reverse(name, args=args, kwargs=kwargs))
 
     def get_literal_url(self, url, auto_follow=True, expect_errors=False):
         """
         Gets the passed in URL, as a literal relative URL, without using reverse.
         """
-        return self._get_url_raw(url, auto_follow=auto_follow, expect_errors=expect_errors)
+        with self._record_action("get_literal_url", url):
+            return self._get_url_raw(url, auto_follow=auto_follow, expect_errors=expect_errors)
 
     def is_element_present(self, css_selector):
         """
         Returns True if the element specified by the CSS selector is present on the current page,
         False otherwise.
         """
-        return len(self._make_pq(self.last_response).find(css_selector)) > 0
+        return len(self._find_by_css_selector(self.last_response, css_selector)) > 0
 
     @property
     def is_full_browser_test(self):
@@ -173,11 +208,18 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         """
         Set a dictionary of items directly into the Django session.
         """
-        session = self._get_session()
-        for name, value in item_dict.items():
-            session[name] = str(value)
-        session.save()
-        self._update_session_cookie(session)  # Required for signed_cookie backend
+        with self.session_transaction() as session:
+            for name, value in item_dict.items():
+                session[name] = str(value)
+
+    def session_transaction(self):
+        """
+        Returns a context manager that yields the Django session, for making
+        several changes to it at once. Changes made inside the block (including
+        by ``set_session_data`` and ``shortcut_login``) are saved once at the
+        end of the block, and discarded if an exception is raised.
+        """
+        return self._session_transaction()
 
     def new_browser_session(self):
         """
@@ -217,11 +259,12 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
                 filter_selector="input[type=submit], button",
             )
 
-        response = form.submit(field_name)
-        if auto_follow:
-            while 300 <= response.status_int < 400:
-                response = response.follow()
-        self.last_responses.append(response)
+        with self._record_action("submit", css_selector):
+            response = form.submit(field_name)
+            if auto_follow:
+                while 300 <= response.status_int < 400:
+                    response = response.follow()
+            self._add_response(response)
 
     def value(self, css_selector):
         """
@@ -238,6 +281,17 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
 
     # WebTest specific
 
+    # Configuration attributes
+    parse_cache_size = 20  # number of parsed responses kept
+
+    parse_cache_max_bytes = 50 * 1024 * 1024  # total size of response bodies kept parsed
+
+    streaming_search_threshold = 1024 * 1024  # response size above which assertTextPresent streams
+
+    check_subresources = False  # fetch and check stylesheets, scripts and images for every page
+
+    subresource_max_workers = 8  # threads used for fetching sub-resources
+
     @property
     def last_response(self):
         """
@@ -245,12 +299,115 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         """
         return self.last_responses[-1]
 
+    def run_crowd(self, func, size, max_workers=None, start_together=True, raise_exceptions=True):
+        """
+        Runs ``func(member)`` concurrently for ``size`` independent browser
+        sessions, each on its own thread. ``member`` is a copy of this test case
+        with its own WebTest app, so all the normal methods can be used with it.
+        Returns a list of ``CrowdResult`` objects, one for each member.
+
+        When tests use an in-memory SQLite database, the requests from different
+        members are run one at a time, since they have to share the test's
+        database connection, so requests don't actually overlap.
+        """
+        results = [CrowdResult(i) for i in range(size)]
+
+        def make_task(result):
+            member = self._make_crowd_member()
+            record_requests(member.app, result)
+            # Outside record_requests, so that time spent waiting for other
+            # members isn't included in the timings.
+            serialize_requests(member.app)
+
+            def task():
+                start = time.perf_counter()
+                try:
+                    return func(member)
+                finally:
+                    result.elapsed = time.perf_counter() - start
+
+            return task
+
+        outcomes = run_concurrently(
+            [make_task(result) for result in results], max_workers=max_workers, start_together=start_together
+        )
+        for result, (value, exception) in zip(results, outcomes):
+            result.value = value
+            result.exception = exception
+        if raise_exceptions:
+            for result in results:
+                if result.exception is not None:
+                    raise result.exception
+        return results
+
+    def crawl(self, start_url=None, max_depth=None, max_pages=None, include=None, exclude=None, concurrency=8):
+        """
+        Crawls the site breadth-first, following links to pages on the same
+        site, starting from ``start_url`` (or the current page), and returns a
+        ``CrawlReport``. The current page is not changed.
+        """
+        if start_url is None:
+            start_url = self.current_url if self.last_responses else "/"
+        return crawl(
+            self.app,
+            [start_url],
+            max_depth=max_depth,
+            max_pages=max_pages,
+            include=include,
+            exclude=exclude,
+            concurrency=concurrency,
+        )
+
+    def get_subresources(self):
+        """
+        Fetches the stylesheets, scripts and images used by the current page,
+        and returns a list of ``SubresourceResult`` objects for them.
+        """
+        response = self.last_response
+        urls = extract_subresource_urls(self._get_parsed_document(response), response.request.url)
+        return fetch_subresources(
+            self._subresource_app(), urls, self._subresource_results, max_workers=self.subresource_max_workers
+        )
+
+    def _subresource_app(self):
+        # A separate app with a copy of the cookies, so that the fetches, from
+        # other threads, can't change the cookies that the test is using.
+        app = self.app_class(extra_environ=dict(self.app.extra_environ))
+        for cookie in self.app.cookiejar:
+            app.cookiejar.set_cookie(copy.copy(cookie))
+        return app
+
+    def assertNoBrokenSubresources(self):
+        """
+        Asserts that all the stylesheets, scripts and images used by the
+        current page can be fetched without errors.
+        """
+        broken = [result for result in self.get_subresources() if result.status is None or result.status >= 400]
+        if broken:
+            self.fail(
+                f"Broken sub-resources on {self.current_url}:\n"
+                + "\n".join(f"  {result.url}: {result.status or 'error'}" for result in broken)
+            )
+
+    def assertMaxPageWeight(self, max_bytes):
+        """
+        Asserts that the total size of the current page and all its stylesheets,
+        scripts and images is no more than ``max_bytes``.
+        """
+        subresources = self.get_subresources()
+        total = len(self.last_response.body) + sum(result.size for result in subresources)
+        if total > max_bytes:
+            largest = sorted(subresources, key=lambda result: result.size, reverse=True)[:5]
+            self.fail(
+                f"Page weight of {self.current_url} is {total} bytes, more than {max_bytes}. Largest sub-resources:\n"
+                + "\n".join(f"  {result.url}: {result.size}" for result in largest)
+            )
+
     # Semi-public (used by mixins)
 
     def flush_session(self):
-        session = self._get_session()
-        session.flush()
-        self._update_session_cookie(session)  # Required for signed_cookie backend
+        with self._session_transaction() as session:
+            session.flush()
 
     # Implementation methods - private
     @property
@@ -266,16 +423,11 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
     def _set_cookie(self, name, value):
         self.app.set_cookie(name, value)
 
-    def _get_session(self):
+    def _get_session_key(self):
         session_key = self.app.cookies.get(settings.SESSION_COOKIE_NAME, None)
-        if session_key is None:
-            # Create new
-            session = get_session_store()
-            self._update_session_cookie(session)
-        else:
+        if session_key is not None:
             session_key = session_key.strip('"')
-            session = get_session_store(session_key=session_key)
-        return session
+        return session_key
 
     def _update_session_cookie(self, session):
         if session.is_empty():
@@ -283,16 +435,72 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         else:
             self._set_cookie(settings.SESSION_COOKIE_NAME, session.session_key)
 
+    def _get_checkpoint_state(self):
+        cookies = [copy.copy(cookie) for cookie in self.app.cookiejar if cookie.name != settings.SESSION_COOKIE_NAME]
+        return {"cookies": cookies, "responses": list(self.last_responses)}
+
+    def _restore_checkpoint_state(self, state, session_data):
+        self.app.cookiejar.clear()
+        for cookie in state["cookies"]:
+            self.app.cookiejar.set_cookie(copy.copy(cookie))
+        self._restore_checkpoint_session_data(session_data)
+        responses = []
+        for response in state["responses"]:
+            # Copied so that a checkpoint can be restored any number of times,
+            # without forms filled in by one test leaking into another.
+            response = copy.copy(response)
+            response.test_app = self.app
+            response._forms_indexed = None
+            responses.append(response)
+        self._all_last_responses[self.app] = responses
+
+    def _make_crowd_member(self):
+        # Not copy.copy, which uses Django's TestCase.__getstate__ and so drops
+        # attributes that can't be pickled.
+        member = object.__new__(type(self))
+        member.__dict__.update(self.__dict__)
+        # Containers that aren't reset below are copied, so that a member
+        # can't change the state of the test case, or of other members.
+        for name, value in self.__dict__.items():
+            if isinstance(value, (list, dict, set)):
+                setattr(member, name, copy.copy(value))
+        member.app = self.app_class(extra_environ=dict(self.extra_environ))
+        member._all_last_responses = defaultdict(list)
+        member._all_apps = []
+        member.parse_cache = ParseCache(max_entries=self.parse_cache_size, max_bytes=self.parse_cache_max_bytes)
+        member._subresource_results = {}
+        member._session_in_transaction = None
+        member._action_log = []
+        member._action_in_progress = None
+        # Cleanups and test outcome belong to the test case that is running
+        member._cleanups = []
+        member._outcome = None
+        return member
+
+    def _get_action_request_thread(self):
+        # Requests are handled in the thread that makes them
+        return threading.get_ident()
+
     def _get_url_raw(self, url, auto_follow=True, expect_errors=False):
         """
         'raw' method for getting URL - not compatible between FullBrowserTest and WebTestBase
         """
-        self.last_responses.append(self.app.get(url, auto_follow=auto_follow, expect_errors=expect_errors))
+        self._add_response(self.app.get(url, auto_follow=auto_follow, expect_errors=expect_errors))
         return self.last_response
 
+    def _add_response(self, response):
+        self.last_responses.append(response)
+        if self._action_in_progress is not None:
+            self._action_in_progress.bytes += len(response.body)
+        if self.check_subresources and response.content_type == "text/html":
+            self.assertNoBrokenSubresources()
+
+    def _find_by_css_selector(self, response, css_selector):
+        doc = self._get_parsed_document(response)
+        return PyQuery(doc.select(css_selector), parent=doc.pq)
+
     def _find_form_by_css_selector(self, response, css_selector):
-        pq = self._make_pq(response)
-        items = pq.find(css_selector)
+        items = self._find_by_css_selector(response, css_selector)
         if any(item.tag == "form" for item in items):
             if len(items) > 1:
                 raise WebTestMultipleElementsException(f"Found multiple forms matching {css_selector}")
@@ -300,15 +508,23 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         else:
             raise WebTestNoSuchElementException(f"Can't find form matching {css_selector}")
 
+    def _find_forms_and_fields_by_css_selectors(self, response, css_selectors):
+        # All selectors are resolved before anything is changed, against the
+        # same parsed document. Each one is still looked up separately, but
+        # simple selectors are answered from the DOM index and the element to
+        # form map is built only once, so there's no walk of the document for
+        # each field.
+        return [self._find_form_and_field_by_css_selector(response, selector) for selector in css_selectors]
+
     def _find_form_and_field_by_css_selector(self, response, css_selector, filter_selector=None, require_name=True):
-        pq = self._make_pq(response)
-        items = pq.find(css_selector)
+        index = self._get_dom_index(response)
+        items = self._find_by_css_selector(response, css_selector)
 
         found = []
         if filter_selector:
             items = items.filter(filter_selector)
         for item in items:
-            form_elem = self._find_parent_form(item)
+            form_elem = index.get_form(item)
             if form_elem is None:
                 raise WebTestCantUseElement(f"Can't find form for input {css_selector}.")
             form = self._match_form_elem_to_webtest_form(form_elem, response)
@@ -326,14 +542,6 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
 
         raise WebTestNoSuchElementException(f"Can't find element matching {css_selector} in response {response}.")
 
-    def _find_parent_form(self, elem):
-        p = elem.getparent()
-        if p is None:
-            return None
-        if p.tag == "form":
-            return p
-        return self._find_parent_form(p)
-
     def _fill_field_by_text(self, form, field_name, text):
         field = form[field_name]
         if field.tag == "select":
@@ -347,9 +555,7 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
             raise WebTestCantUseElement(f"Don't know how to 'fill_by_text' for elements of type '{field.tag}'")
 
     def _match_form_elem_to_webtest_form(self, form_elem, response):
-        pq = self._make_pq(response)
-        forms = pq("form")
-        form_index = forms.index(form_elem)
+        form_index = self._get_dom_index(response).get_form_position(form_elem)
         webtest_form = response.forms[form_index]
         form_sig = {
             "action": form_elem.attrib.get("action", ""),
@@ -366,15 +572,34 @@ class FuncWebTestMixin(WebTestMixin, CommonMixin, FuncBaseMixin):
         return webtest_form
 
     def _make_pq(self, response):
+        return self._get_parsed_document(response).pq
+
+    def _get_dom_index(self, response):
+        return self._get_parsed_document(response).index
+
+    def _get_parsed_document(self, response):
         # Cache to save parsing every time
-        if not hasattr(self, "_pq_cache"):
-            self._pq_cache = {}
-        if response in self._pq_cache:
-            return self._pq_cache[response]
+        return self.parse_cache.get(response, self._parse_response)
+
+    def _stream_search(self, response, text, within):
+        # For big responses that haven't been parsed yet, try to find the text
+        # without building the full tree. Only a positive result is useful.
+        if (
+            self.streaming_search_threshold is None
+            or response in self.parse_cache
+            or "html" not in response.content_type
+        ):
+            return False
+        body = response.testbody
+        if len(body) < self.streaming_search_threshold:
+            return False
+        return bool(stream_search(body, within, html_norm(escape(text))))
+
+    def _parse_response(self, response):
+        body = response.testbody
         # Don't use `response.pyquery` because of https://github.com/Pylons/webtest/issues/245
-        pq = PyQuery(response.testbody, parser="html" if "html" in response.content_type else "xml")
-        self._pq_cache[response] = pq
-        return pq
+        pq = PyQuery(body, parser="html" if "html" in response.content_type else "xml")
+        return ParsedDocument(pq, size=len(body))
 
 
 def inner_text(elem, root=True):
@@ -0,0 +1,232 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.core import signals
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+ActionRecord = namedtuple(
+    "ActionRecord", ["action", "target", "wall_time", "server_time", "queries", "requests", "bytes", "sql"]
+)
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts queries for each thread separately,
+    so that it can be used with connections shared between threads.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Every connection, from any thread, that the wrapper was installed on
+        self._connections = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self._local.count = self.count + 1
+        sql_log = getattr(self._local, "sql_log", None)
+        if sql_log is not None:
+            sql_log.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+    @property
+    def sql_log(self):
+        """
+        List of SQL run by the current thread, while logging is on.
+        """
+        sql_log = getattr(self._local, "sql_log", None)
+        if sql_log is None:
+            sql_log = self._local.sql_log = []
+        return sql_log
+
+    def clear_sql_log(self):
+        self._local.sql_log = None
+
+    def reset(self):
+        self._local.count = 0
+
+    def install(self):
+        # Shared connections get the wrapper once, from the first thread that
+        # installs it. Each thread's own connections are added as they are used.
+        with self._lock:
+            for conn in connections.all():
+                if self not in conn.execute_wrappers:
+                    conn.execute_wrappers.append(self)
+                    self._connections.append(conn)
+
+    def uninstall(self):
+        # `connections.all()` would only give the current thread's connections
+        with self._lock:
+            for conn in self._connections:
+                if self in conn.execute_wrappers:
+                    conn.execute_wrappers.remove(self)
+            self._connections = []
+
+
+class ActionRecorder:
+    """
+    Totals for the requests handled while an action is in progress.
+    """
+
+    def __init__(self, thread=None):
+        # Only requests handled by this thread are counted, or all requests if None
+        self.thread = thread
+        self.requests = 0
+        self.server_time = 0.0
+        self.queries = 0
+        self.bytes = 0
+        self.sql = []
+
+    def to_record(self, action, target, wall_time):
+        return ActionRecord(
+            action, target, wall_time, self.server_time, self.queries, self.requests, self.bytes, list(self.sql)
+        )
+
+
+class RequestMonitor:
+    """
+    Measures the time taken and queries run by requests that Django handles,
+    in any thread, and adds them to the active ActionRecorder objects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recorders = []
+        self._local = threading.local()
+        self._connected = False
+        self.query_counter = QueryCounter()
+
+    def start(self, recorder):
+        with self._lock:
+            if not self._connected:
+                signals.request_started.connect(self._request_started, weak=False)
+                signals.request_finished.connect(self._request_finished, weak=False)
+                self._connected = True
+            self._recorders.append(recorder)
+
+    def stop(self, recorder):
+        # Requests that are still in progress, such as a live server thread
+        # finishing a response that the browser has already used, are not
+        # waited for, and are not counted.
+        with self._lock:
+            self._recorders.remove(recorder)
+
+    def disconnect(self):
+        """
+        Removes the signal handlers and query counter, until the next ``start``.
+        """
+        with self._lock:
+            if not self._connected:
+                return
+            signals.request_started.disconnect(self._request_started)
+            signals.request_finished.disconnect(self._request_finished)
+            self._connected = False
+        self.query_counter.uninstall()
+
+    def _request_started(self, **kwargs):
+        if not self._recorders:
+            return
+        self.query_counter.install()
+        ident = threading.get_ident()
+        with self._lock:
+            recorders = [recorder for recorder in self._recorders if recorder.thread in (None, ident)]
+        # A queue, because with ASGI, requests can overlap in the same thread.
+        requests = self._local.__dict__.setdefault("requests", [])
+        sql_log = self.query_counter.sql_log
+        requests.append((recorders, time.perf_counter(), self.query_counter.count, len(sql_log)))
+
+    def _request_finished(self, **kwargs):
+        requests = getattr(self._local, "requests", None)
+        if not requests:
+            return
+        recorders, start, start_queries, sql_log_start = requests.pop(0)
+        elapsed = time.perf_counter() - start
+        queries = self.query_counter.count - start_queries
+        sql = self.query_counter.sql_log[sql_log_start:]
+        if not requests:
+            self.query_counter.clear_sql_log()
+        with self._lock:
+            for recorder in recorders:
+                recorder.requests += 1
+                recorder.server_time += elapsed
+                recorder.queries += queries
+                recorder.sql.extend(sql)
+
+
+monitor = RequestMonitor()
+
+
+def format_action_log(action_log):
+    """
+    Returns a summary of a list of ActionRecord objects, as a string.
+    """
+    lines = [
+        f"{len(action_log)} actions, {sum(record.wall_time for record in action_log):.2f}s, "
+        f"{sum(record.queries for record in action_log)} queries"
+    ]
+    for record in action_log:
+        lines.append(
+            f"  {record.action} {record.target}: {record.wall_time * 1000:.1f} ms "
+            f"(server {record.server_time * 1000:.1f} ms), {record.queries} queries, {record.bytes} bytes"
+        )
+    return "\n".join(lines)
+
+
+_SQL_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SQL_PLACEHOLDER_RE = re.compile(r"%s|\?|%\(\w+\)s")
+_SQL_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SQL_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def sql_shape(sql):
+    """
+    Returns SQL with literal values and parameters replaced by ``?``, and lists
+    of them replaced by ``(...)``, so that queries that differ only in their
+    values have the same shape.
+    """
+    sql = _SQL_STRING_RE.sub("?", sql)
+    sql = _SQL_NUMBER_RE.sub("?", sql)
+    sql = _SQL_PLACEHOLDER_RE.sub("?", sql)
+    sql = _SQL_IN_LIST_RE.sub("(...)", sql)
+    return _SQL_WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def find_repeated_queries(sql, max_repeats):
+    """
+    Groups a list of SQL by shape, and returns a list of (shape, count) tuples
+    for the shapes that appear more than ``max_repeats`` times, most frequent
+    first.
+    """
+    counts = Counter(sql_shape(query) for query in sql)
+    return [(shape, count) for shape, count in counts.most_common() if count > max_repeats]
+
+
+def format_repeated_queries(action_log, max_repeats):
+    """
+    Returns a report of the queries repeated more than ``max_repeats`` times
+    for each ActionRecord in a list, as a string.
+    """
+    lines = []
+    for record in action_log:
+        repeated = find_repeated_queries(record.sql, max_repeats)
+        if repeated:
+            lines.append(f"{record.action} {record.target}:")
+            lines.extend(f"  {count} x {shape}" for shape, count in repeated)
+    return "\n".join(lines)
+
+
+def log_action_log(name, action_log):
+    """
+    Logs a summary of a list of ActionRecord objects, for the test with the
+    given name.
+    """
+    logger.info("%s: %s", name, format_action_log(action_log))
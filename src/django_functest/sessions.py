@@ -0,0 +1,127 @@
+"""
+A session engine that keeps sessions in process memory, for use in tests.
+
+Use it by setting ``SESSION_ENGINE = "django_functest.sessions"`` in your test
+settings. It is safe to use from multiple threads, such as the test thread and
+live server threads.
+
+If ``DJANGO_FUNCTEST_SESSION_WRITE_THROUGH_ENGINE`` is set to the name of
+another session engine, all writes are also made to that engine, and sessions
+not found in memory are loaded from it.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase, UpdateError
+
+from .utils import _get_session_store_class
+
+_lock = threading.Lock()
+_sessions = {}  # session key -> (encoded session data, expiry timestamp)
+
+
+def clear():
+    """
+    Removes all sessions stored in memory.
+    """
+    with _lock:
+        _sessions.clear()
+
+
+class SessionStore(SessionBase):
+    """
+    An in-memory session store.
+    """
+
+    def load(self):
+        session_key = self.session_key
+        data = None
+        if session_key is not None:
+            with _lock:
+                entry = _sessions.get(session_key)
+                if entry is not None:
+                    data, expiry = entry
+                    if expiry < time.time():
+                        del _sessions[session_key]
+                        data = None
+            if data is None:
+                data = self._load_write_through(session_key)
+        if data is None:
+            self._session_key = None
+            return {}
+        return self.decode(data)
+
+    def exists(self, session_key):
+        if not session_key:
+            return False
+        with _lock:
+            if session_key in _sessions:
+                return True
+        write_through = _get_write_through_store()
+        return write_through is not None and write_through.exists(session_key)
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        session_dict = self._get_session(no_load=must_create)
+        data = self.encode(session_dict)
+        expiry = time.time() + self.get_expiry_age()
+        with _lock:
+            if must_create and self.session_key in _sessions:
+                raise CreateError
+            if not must_create and self.session_key not in _sessions:
+                raise UpdateError
+            _sessions[self.session_key] = (data, expiry)
+        write_through = _get_write_through_store(self.session_key)
+        if write_through is not None:
+            write_through._session_cache = dict(session_dict)
+            write_through.save(must_create=not write_through.exists(self.session_key))
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        with _lock:
+            _sessions.pop(session_key, None)
+        write_through = _get_write_through_store()
+        if write_through is not None:
+            write_through.delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        now = time.time()
+        with _lock:
+            for session_key in [k for k, (_, expiry) in _sessions.items() if expiry < now]:
+                del _sessions[session_key]
+
+    def _load_write_through(self, session_key):
+        write_through = _get_write_through_store(session_key)
+        if write_through is None or not write_through.exists(session_key):
+            return None
+        session_dict = write_through.load()
+        data = self.encode(session_dict)
+        # Passing expiry explicitly stops get_expiry_age() from loading this session.
+        expiry = time.time() + self.get_expiry_age(expiry=session_dict.get("_session_expiry"))
+        with _lock:
+            _sessions[session_key] = (data, expiry)
+        return data
+
+
+def _get_write_through_store(session_key=None):
+    engine_name = getattr(settings, "DJANGO_FUNCTEST_SESSION_WRITE_THROUGH_ENGINE", None)
+    if not engine_name:
+        return None
+    return _get_session_store_class(engine_name)(session_key=session_key)
@@ -0,0 +1,83 @@
+import time
+from collections import namedtuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from .concurrency import run_concurrently, shared_database_access
+
+SubresourceResult = namedtuple("SubresourceResult", ["url", "status", "size", "elapsed"])
+
+# Values of <link rel> for things that a browser will fetch along with the page
+_LINK_RELS = {"stylesheet", "icon", "preload", "modulepreload", "manifest", "apple-touch-icon"}
+
+
+def extract_subresource_urls(document, page_url):
+    """
+    Returns a list of the URLs of the stylesheets, scripts and images in a
+    ParsedDocument, as relative URLs (path and query string). URLs on other
+    sites, and data: URLs, are not included.
+    """
+    index = document.index
+    candidates = []
+    for elem in index.by_tag.get("link", []):
+        if _LINK_RELS.intersection(elem.get("rel", "").lower().split()):
+            candidates.append(elem.get("href"))
+    for tag in ("script", "img"):
+        candidates.extend(elem.get("src") for elem in index.by_tag.get(tag, []))
+    return same_site_urls(document, page_url, candidates)
+
+
+def same_site_urls(document, page_url, candidates):
+    """
+    Resolves the URLs in ``candidates``, which were found in a ParsedDocument,
+    and returns a de-duplicated list of those that are on the same site as
+    the page, as relative URLs (path and query string).
+    """
+    base_url = page_url
+    for base in document.index.by_tag.get("base", []):
+        if base.get("href"):
+            base_url = urljoin(page_url, base.get("href"))
+            break
+
+    page_netloc = urlsplit(page_url).netloc
+    urls = []
+    for candidate in candidates:
+        if not candidate or not candidate.strip():
+            continue
+        parts = urlsplit(urljoin(base_url, candidate.strip()))
+        if parts.scheme not in ("http", "https") or parts.netloc != page_netloc:
+            continue
+        url = urlunsplit(("", "", parts.path, parts.query, ""))
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+def fetch_subresources(app, urls, cache, max_workers=None):
+    """
+    Fetches the URLs using a WebTest app, concurrently, returning a list of
+    SubresourceResult objects. ``cache`` is a dictionary of URL to
+    SubresourceResult, used to skip URLs that have already been fetched, and
+    updated with the new results.
+    """
+    missing = [url for url in urls if url not in cache]
+
+    def make_fetch(url):
+        def fetch():
+            start = time.perf_counter()
+            try:
+                with shared_database_access():
+                    response = app.get(url, expect_errors=True)
+            except Exception:
+                # Errors that escape the handler are treated as broken resources
+                return SubresourceResult(url, None, 0, time.perf_counter() - start)
+            return SubresourceResult(url, response.status_int, len(response.body), time.perf_counter() - start)
+
+        return fetch
+
+    for url, (result, exception) in zip(
+        missing, run_concurrently([make_fetch(url) for url in missing], max_workers=max_workers)
+    ):
+        if exception is not None:
+            raise exception
+        cache[url] = result
+    return [cache[url] for url in urls]
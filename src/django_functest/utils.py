@@ -1,4 +1,8 @@
+import hashlib
+import time
 import warnings
+from contextlib import contextmanager
+from functools import lru_cache
 from importlib import import_module
 
 import django
@@ -9,7 +13,8 @@ from django.contrib.auth import SESSION_KEY as AUTH_ID_SESSION_KEY
 from django.contrib.auth import authenticate
 from django.utils.html import escape
 from furl import furl
-from lxml import etree
+
+from .instrumentation import ActionRecorder, format_action_log, format_repeated_queries, log_action_log, monitor
 
 
 class _NotPassed:
@@ -19,11 +24,27 @@ class _NotPassed:
 NotPassed = _NotPassed()
 
 
+# Hash of credentials -> (user pk, backend path, username, password hash), for
+# users that shortcut_login has successfully authenticated. Cleared after each
+# test class, since user pks can be reused.
+_authenticated_users = {}
+
+# (test class, name) -> (database state, session data, engine specific state),
+# saved by CommonMixin.checkpoint()
+_checkpoints = {}
+
+# Attributes that password hashers use for their work factor.
+_SLOW_HASHER_ATTRIBUTES = ["iterations", "rounds", "time_cost", "work_factor"]
+
+
 class ShortcutLoginMixin:
     """
     A mixin that provides a fast way of logging in and out.
     """
 
+    # Warn when logging in with credentials and the default password hasher is slow.
+    warn_slow_password_hasher = False
+
     def shortcut_login(self, user=None, **credentials):
         """
         Login a user directly. Pass the user object, without a password,
@@ -33,17 +54,11 @@ class ShortcutLoginMixin:
             if credentials:
                 raise AssertionError("Either pass 'user' or **credentials, not both")
 
-            def get_backend():
-                from django.contrib.auth import load_backend
-
-                for backend_path in settings.AUTHENTICATION_BACKENDS:
-                    backend = load_backend(backend_path)
-                    if hasattr(backend, "get_user"):
-                        return backend_path
-
-            user.backend = get_backend()
+            user.backend = _get_user_backend_path(tuple(settings.AUTHENTICATION_BACKENDS))
         else:
-            user = authenticate(**credentials)
+            if self.warn_slow_password_hasher:
+                _warn_if_slow_password_hasher()
+            user = _authenticate_cached(credentials)
             if not user:
                 raise ValueError(f"User {user} was not authenticated")
 
@@ -63,19 +78,121 @@ class ShortcutLoginMixin:
     def shortcut_logout(self):
         self.flush_session()
 
+    @classmethod
+    def tearDownClass(cls):
+        _authenticated_users.clear()
+        super().tearDownClass()
+
+
+@lru_cache(maxsize=None)
+def _get_user_backend_path(backend_paths):
+    from django.contrib.auth import load_backend
+
+    for backend_path in backend_paths:
+        backend = load_backend(backend_path)
+        if hasattr(backend, "get_user"):
+            return backend_path
+
+
+def _authenticate_cached(credentials):
+    # Password hashers are deliberately slow, so we remember which user some
+    # credentials authenticated as. This is only valid while the user's
+    # username, password hash and active status are unchanged, which is
+    # checked with a single query.
+    from django.contrib.auth import load_backend
+
+    key = (tuple(settings.AUTHENTICATION_BACKENDS), _hash_credentials(credentials))
+    cached = _authenticated_users.pop(key, None)
+    if cached is not None:
+        user_pk, backend_path, username, password_hash = cached
+        backend = load_backend(backend_path)
+        user = backend.get_user(user_pk)
+        if (
+            user is not None
+            and user.password == password_hash
+            and _get_username(user) == username
+            and (not hasattr(backend, "user_can_authenticate") or backend.user_can_authenticate(user))
+        ):
+            user.backend = backend_path
+            _authenticated_users[key] = cached
+            return user
+
+    user = authenticate(**credentials)
+    # Without a password, we can't tell when the credentials stop being valid.
+    if user is not None and "password" in credentials and getattr(user, "password", None):
+        _authenticated_users[key] = (user.pk, user.backend, _get_username(user), user.password)
+    return user
+
+
+def _hash_credentials(credentials):
+    # So that plaintext passwords aren't kept around
+    return hashlib.sha256(repr(sorted(credentials.items())).encode("utf-8")).hexdigest()
 
-def get_session_store(session_key=None):
-    engine = import_module(settings.SESSION_ENGINE)
+
+def _get_username(user):
+    return getattr(user, user.USERNAME_FIELD, None) if hasattr(user, "USERNAME_FIELD") else None
+
+
+def _warn_if_slow_password_hasher():
+    from django.contrib.auth.hashers import get_hasher
+
+    hasher = get_hasher()
+    if any(hasattr(hasher, attr) for attr in _SLOW_HASHER_ATTRIBUTES):
+        warnings.warn(
+            f"The {hasher.algorithm!r} password hasher is slow. For faster tests, set "
+            "PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher'] in your test settings.",
+            stacklevel=3,
+        )
+
+
+@lru_cache(maxsize=None)
+def _get_session_store_class(engine_name):
+    return import_module(engine_name).SessionStore
+
+
+def get_session_store(session_key=None, create=True):
+    # The engine is looked up by name, so that overriding SESSION_ENGINE in
+    # tests still works, but the import machinery is only used once per engine.
+    SessionStore = _get_session_store_class(settings.SESSION_ENGINE)
     # Implement a database session store object that will contain the session key.
-    store = engine.SessionStore(session_key=session_key)
-    if session_key is None:
+    store = SessionStore(session_key=session_key)
+    # An existing session is loaded lazily, on first access.
+    if session_key is None and create:
         store.save()
-    else:
-        store.load()
     return store
 
 
 class CommonMixin:
+    # The session being changed inside session_transaction(), if any.
+    _session_in_transaction = None
+
+    # Created when the first action is recorded, see action_log
+    _action_log = None
+
+    # The ActionRecorder for the action currently being done, if any.
+    _action_in_progress = None
+
+    # If True, actions are recorded in action_log for the whole test, rather
+    # than only inside assertMaxQueries etc.
+    record_actions = False
+
+    # Number of assertMaxQueries etc. blocks currently active
+    _action_recording_blocks = 0
+
+    # Models compared by get_checkpoint_db_state, or None for all models.
+    checkpoint_models = None
+
+    @classmethod
+    def tearDownClass(cls):
+        # Checkpoints can only be used by tests in the same class
+        for key in [key for key in _checkpoints if key[0] is cls]:
+            del _checkpoints[key]
+        super().tearDownClass()
+
+    def tearDown(self):
+        monitor.disconnect()
+        super().tearDown()
+
     def assertion_passes(self, a_callable, *args, **kwargs):
         """
         Given a callable which may raise an AssertionError, plus optional arguments to pass
@@ -128,38 +245,260 @@ class CommonMixin:
         """
         self.fill({f'[name="{prefix}{k}"]': v for k, v in fields.items()}, scroll=scroll)
 
-    def _assertTextPresent(self, text, pyquery_obj, within):
+    def _assertTextPresent(self, text, document, within):
         norm_text = html_norm(escape(text))
-        matching_elements = pyquery_obj.find(within)
+        matching_elements = document.select(within)
         if len(matching_elements) == 0:
             self.fail(f"No elements matched the CSS selector {within!r}")
         elif len(matching_elements) == 1:
             # Better error message for the common case:
-            self.assertIn(
-                norm_text,
-                etree.tostring(matching_elements[0], encoding="unicode"),
-            )
+            if not document.serialized_contains(matching_elements[0], norm_text):
+                self.assertIn(norm_text, document.serialize(matching_elements[0]))
         else:
             self.assertTrue(
-                any(norm_text in etree.tostring(elem, encoding="unicode") for elem in matching_elements),
+                any(document.serialized_contains(elem, norm_text) for elem in matching_elements),
                 f"Didn't find {text!r} inside any of the {len(matching_elements)} matching elements for {within!r}",
             )
 
-    def _assertTextAbsent(self, text, pyquery_obj, within):
+    def _assertTextAbsent(self, text, document, within):
         norm_text = html_norm(escape(text))
-        matching_elements = pyquery_obj.find(within)
+        matching_elements = document.select(within)
         if len(matching_elements) == 1:
             # Better error message for the common case:
-            self.assertNotIn(
-                norm_text,
-                etree.tostring(matching_elements[0], encoding="unicode"),
-            )
+            if document.serialized_contains(matching_elements[0], norm_text):
+                self.assertNotIn(norm_text, document.serialize(matching_elements[0]))
         else:
             self.assertFalse(
-                any(norm_text in etree.tostring(elem, encoding="unicode") for elem in matching_elements),
+                any(document.serialized_contains(elem, norm_text) for elem in matching_elements),
                 f"Didn't find {text!r} inside any of the {len(matching_elements)} matching_elements for {within!r}",
             )
 
+    def _assertTextsPresent(self, texts, document, within):
+        # The document is fetched and parsed once, and each `within` selector is
+        # used just once. Searching is done with str.find on the serialized
+        # elements, which for the number of texts involved is faster in CPython
+        # than a pure Python multi-pattern algorithm.
+        problems = []
+        for selector, selector_texts in group_texts_by_selector(texts, within).items():
+            matching_elements = document.select(selector)
+            if len(matching_elements) == 0:
+                problems.append(f"No elements matched the CSS selector {selector!r}")
+                continue
+            for text in selector_texts:
+                norm_text = html_norm(escape(text))
+                if not any(document.serialized_contains(elem, norm_text) for elem in matching_elements):
+                    problems.append(f"Didn't find {text!r} inside {selector!r}")
+        if problems:
+            self.fail("\n".join(problems))
+
+    def _assertTextsAbsent(self, texts, document, within):
+        problems = []
+        for selector, selector_texts in group_texts_by_selector(texts, within).items():
+            matching_elements = document.select(selector)
+            for text in selector_texts:
+                norm_text = html_norm(escape(text))
+                if any(document.serialized_contains(elem, norm_text) for elem in matching_elements):
+                    problems.append(f"Found {text!r} inside {selector!r}")
+        if problems:
+            self.fail("\n".join(problems))
+
+    def checkpoint(self, name):
+        """
+        Saves the current browser state (cookies, session data and current
+        page) under the given name, so that it can be returned to later, in
+        this or another test in the same class, using ``restore``.
+        """
+        session_data = {} if self._get_session_key() is None else self.get_session_data()
+        _checkpoints[type(self), name] = (self.get_checkpoint_db_state(), session_data, self._get_checkpoint_state())
+
+    def restore(self, name):
+        """
+        Restores the browser state saved by ``checkpoint`` with the given name.
+        Returns True if it was restored, or False if there is no such checkpoint,
+        or if the database has changed since it was saved.
+        """
+        key = (type(self), name)
+        if key not in _checkpoints:
+            return False
+        db_state, session_data, state = _checkpoints[key]
+        if db_state != self.get_checkpoint_db_state():
+            del _checkpoints[key]
+            return False
+        self._restore_checkpoint_state(state, session_data)
+        return True
+
+    def get_checkpoint_db_state(self):
+        """
+        Returns a value that changes when rows are added to or deleted from the
+        database, used by ``checkpoint`` and ``restore``. By default this is the
+        row count and maximum primary key of each of ``checkpoint_models`` (or
+        every model apart from session models). Rows updated in place are not
+        detected.
+        """
+        from django.apps import apps
+        from django.contrib.sessions.base_session import AbstractBaseSession
+        from django.db.models import Count, Max
+
+        if self.checkpoint_models is not None:
+            models = self.checkpoint_models
+        else:
+            models = apps.get_models()
+        db_state = []
+        for model in models:
+            opts = model._meta
+            if opts.proxy or not opts.managed or issubclass(model, AbstractBaseSession):
+                continue
+            values = model._base_manager.aggregate(count=Count("pk"), max_pk=Max("pk"))
+            db_state.append((opts.label, values["count"], values["max_pk"]))
+        return db_state
+
+    @property
+    def action_log(self):
+        """
+        A list of ``ActionRecord`` objects for the page loads, form submissions
+        and clicks done so far in the test, with timings and query counts.
+        Actions are only recorded if ``record_actions`` is True, or inside
+        ``assertMaxQueries``, ``assertMaxLatency`` and ``assertNoRepeatedQueries``.
+        """
+        if self._action_log is None:
+            self._action_log = []
+            self.addCleanup(self._log_action_summary)
+        return self._action_log
+
+    @contextmanager
+    def assertMaxQueries(self, num):
+        """
+        Returns a context manager that fails if the actions done inside the
+        block caused more than ``num`` database queries in total.
+        """
+        start = len(self.action_log)
+        with self._recording_actions():
+            yield
+        records = self.action_log[start:]
+        queries = sum(record.queries for record in records)
+        if queries > num:
+            self.fail(f"{queries} queries were run, more than {num}:\n{format_action_log(records)}")
+
+    @contextmanager
+    def assertMaxLatency(self, seconds):
+        """
+        Returns a context manager that fails if any of the actions done inside
+        the block took longer than ``seconds``.
+        """
+        start = len(self.action_log)
+        with self._recording_actions():
+            yield
+        records = self.action_log[start:]
+        slow = [record for record in records if record.wall_time > seconds]
+        if slow:
+            self.fail(f"{len(slow)} actions took longer than {seconds}s:\n{format_action_log(slow)}")
+
+    @contextmanager
+    def assertNoRepeatedQueries(self, max_repeats=3):
+        """
+        Returns a context manager that fails if, for any of the actions done
+        inside the block, the same query (apart from parameter values) was run
+        more than ``max_repeats`` times, which usually means an N+1 problem.
+        """
+        start = len(self.action_log)
+        with self._recording_actions():
+            yield
+        report = format_repeated_queries(self.action_log[start:], max_repeats)
+        if report:
+            self.fail(f"Queries were repeated more than {max_repeats} times:\n{report}")
+
+    @contextmanager
+    def _recording_actions(self):
+        self._action_recording_blocks += 1
+        try:
+            yield
+        finally:
+            self._action_recording_blocks -= 1
+
+    @contextmanager
+    def _record_action(self, action, target):
+        # Yields the ActionRecorder, or None if actions aren't being recorded.
+        if self._action_in_progress is not None:
+            # e.g. get_url calling get_literal_url, only the outer one is recorded
+            yield self._action_in_progress
+            return
+        if not (self.record_actions or self._action_recording_blocks):
+            yield None
+            return
+
+        recorder = ActionRecorder(thread=self._get_action_request_thread())
+        self._action_in_progress = recorder
+        monitor.start(recorder)
+        start = time.perf_counter()
+        try:
+            yield recorder
+        finally:
+            wall_time = time.perf_counter() - start
+            self._action_in_progress = None
+            monitor.stop(recorder)
+        self.action_log.append(recorder.to_record(action, target, wall_time))
+
+    def _log_action_summary(self):
+        if self._action_log:
+            log_action_log(self.id(), self._action_log)
+
+    def _restore_checkpoint_session_data(self, session_data):
+        with self._session_transaction() as session:
+            session.flush()
+            session.update(session_data)
+
+    def _get_session(self):
+        if self._session_in_transaction is not None:
+            return self._session_in_transaction
+        session_key = self._get_session_key()
+        if session_key is None:
+            # Create new
+            session = get_session_store()
+            self._update_session_cookie(session)
+        else:
+            session = get_session_store(session_key=session_key)
+        return session
+
+    @contextmanager
+    def _session_transaction(self):
+        if self._session_in_transaction is not None:
+            # Changes are saved by the outermost transaction
+            yield self._session_in_transaction
+            return
+
+        session_key = self._get_session_key()
+        # A new session is not saved until the end, so that there is only one save.
+        session = get_session_store(session_key=session_key, create=False)
+        self._session_in_transaction = session
+        try:
+            yield session
+        finally:
+            self._session_in_transaction = None
+
+        if session.modified and not session.is_empty():
+            session.save()
+        # The key changes for new and flushed sessions, and for every save with
+        # the signed_cookies backend.
+        if session.session_key != session_key:
+            self._update_session_cookie(session)
+
+
+def group_texts_by_selector(texts, within):
+    """
+    Given a list of texts or (text, within) tuples, returns a dictionary
+    of CSS selectors to lists of texts, using `within` as the default selector.
+    """
+    grouped = {}
+    for item in texts:
+        if isinstance(item, str):
+            text, selector = item, within
+        else:
+            text, selector = item
+        selector_texts = grouped.setdefault(selector, [])
+        if text not in selector_texts:
+            selector_texts.append(text)
+    return grouped
+
 
 class AdminLoginMixin(ShortcutLoginMixin):
     """
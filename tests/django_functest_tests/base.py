@@ -2,11 +2,21 @@ import subprocess
 import unittest
 
 import conftest
+import django
 import pytest
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
 from django.test import TestCase, override_settings
 from django_functest import FuncSeleniumMixin, FuncWebTestMixin, MultiThreadedLiveServerMixin
 
+if django.VERSION >= (3, 1):
+    from django_functest import FuncAsgiTestMixin
+else:
+
+    @unittest.skip("FuncAsgiTestMixin needs Django 3.1 or later")
+    class FuncAsgiTestMixin:
+        pass
+
+
 # Getting some errors that seem related to this:
 # http://stackoverflow.com/questions/18281137/selenium-django-gives-foreign-key-error/18292090#18292090 # noqa
 # producing a stacktrace in which a postmigrate handler attempts to
@@ -43,6 +53,10 @@ class WebTestBase(FuncWebTestMixin, TestCase):
     available_apps = AVAILABLE_APPS
 
 
+class AsgiTestBase(FuncAsgiTestMixin, TestCase):
+    available_apps = AVAILABLE_APPS
+
+
 class HideBrowserMixin:
     display = conftest.SHOW_BROWSER
 
@@ -0,0 +1,66 @@
+import time
+
+from .base import AsgiTestBase
+from .models import Thing
+
+try:
+    from django.urls import reverse
+except ImportError:
+    from django.core.urlresolvers import reverse
+
+
+class TestFuncAsgiTest(AsgiTestBase):
+    def test_async_view(self):
+        self.get_url("async_fragment", number=1)
+        self.assertTextPresent("Fragment 1")
+
+    def test_get_literal_urls_concurrently(self):
+        self.get_url("test_misc")
+        urls = [reverse("async_fragment", kwargs={"number": i}) + "?delay=0.2" for i in range(5)]
+        start = time.monotonic()
+        responses = self.get_literal_urls_concurrently(urls)
+        elapsed = time.monotonic() - start
+        assert [r.status_code for r in responses] == [200] * 5
+        for i, response in enumerate(responses):
+            assert f"Fragment {i}" in response.text
+        # 5 requests of 0.2s each, done in parallel
+        assert elapsed < 0.8
+        # Current page is unchanged
+        self.assertUrlsEqual(reverse("test_misc"))
+
+    def test_get_literal_urls_concurrently_sends_cookies(self):
+        self.set_session_data({"name": "The Jabberwocky"})
+        responses = self.get_literal_urls_concurrently([reverse("test_misc"), reverse("test_misc")])
+        for response in responses:
+            assert "Hello to The Jabberwocky" in response.text
+
+    def test_get_literal_urls_concurrently_database(self):
+        # Sync views run in the test thread, and see data in the test transaction
+        Thing.objects.create(name="Rock", element_type=Thing.ELEMENT_EARTH, count=1)
+        responses = self.get_literal_urls_concurrently([reverse("list_things"), reverse("async_fragment", args=[2])])
+        assert "Rock" in responses[0].text
+        assert "Fragment 2" in responses[1].text
+
+    def test_environ_to_scope(self):
+        # Not imported at module level, since it needs Django 3.1 or later
+        from django_functest.funcasgi import environ_to_scope
+
+        scope = environ_to_scope(
+            {
+                "REQUEST_METHOD": "POST",
+                "SCRIPT_NAME": "",
+                "PATH_INFO": "/caf\xc3\xa9/",
+                "QUERY_STRING": "a=1",
+                "CONTENT_TYPE": "text/plain",
+                "CONTENT_LENGTH": "3",
+                "HTTP_X_FOO": "bar",
+                "SERVER_NAME": "testserver",
+                "SERVER_PORT": "80",
+            }
+        )
+        assert scope["method"] == "POST"
+        assert scope["path"] == "/café/"
+        assert scope["query_string"] == b"a=1"
+        assert (b"x-foo", b"bar") in scope["headers"]
+        assert (b"content-type", b"text/plain") in scope["headers"]
+        assert scope["server"] == ("testserver", 80)
@@ -1,4 +1,8 @@
+import gc
+from unittest import mock
+
 import pytest
+from django.conf import settings
 from django_functest import FuncBaseMixin, Upload
 from django_functest.exceptions import (
     SeleniumCantUseElement,
@@ -6,9 +10,11 @@ from django_functest.exceptions import (
     WebTestMultipleElementsException,
     WebTestNoSuchElementException,
 )
+from django_functest.utils import _get_session_store_class
+from lxml import etree
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 
-from .base import ChromeBase, FirefoxBase, WebTestBase
+from .base import ChromeBase, FirefoxBase, FuncAsgiTestMixin, WebTestBase
 from .models import Thing
 
 try:
@@ -109,6 +115,12 @@ class CommonBase(FuncBaseMixin):
         with pytest.raises(AssertionError, match="No elements matched the CSS selector 'p.not-a-real-class'"):
             self.assertTextPresent("Hello world", within="p.not-a-real-class", wait=False)
 
+    def test_assertTextPresent_within_pyquery_selector(self):
+        # Selectors that only PyQuery understands still work
+        self.get_url("test_misc")
+        self.assertTextPresent("Some text", within="p:contains('with a class')")
+        self.assertTextAbsent("Hello world", within="p:contains('with a class')")
+
     def test_assertTextAbsent_within(self):
         self.get_url("test_misc")
         self.assertTextAbsent("Hello world", within="p.myclass")
@@ -117,6 +129,41 @@ class CommonBase(FuncBaseMixin):
 
         self.assertTextAbsent("Hello world", within="p#this-is-not-a-dom-node")
 
+    def test_assertTextsPresent(self):
+        self.get_url("test_misc")
+        self.assertTextsPresent(
+            [
+                "Hello world",
+                "from 'me' & \"friends\"",
+                ("Some text in a p with a class", "p.myclass"),
+                ("Hover me!", "#hoverable"),
+            ]
+        )
+        with pytest.raises(AssertionError) as excinfo:
+            self.assertTextsPresent(
+                [
+                    "Hello world",
+                    "Something definitely not there",
+                    ("Hello world", "p.myclass"),
+                    ("Hello world", "p.not-a-real-class"),
+                ],
+                wait=False,
+            )
+        message = str(excinfo.value)
+        assert "Didn't find 'Something definitely not there' inside 'body'" in message
+        assert "Didn't find 'Hello world' inside 'p.myclass'" in message
+        assert "No elements matched the CSS selector 'p.not-a-real-class'" in message
+
+    def test_assertTextsAbsent(self):
+        self.get_url("test_misc")
+        self.assertTextsAbsent(["Something definitely not there", ("Hello world", "p.myclass")])
+        with pytest.raises(AssertionError) as excinfo:
+            self.assertTextsAbsent(["Hello world", "Not there", ("Hover me!", "#hoverable")])
+        message = str(excinfo.value)
+        assert "Found 'Hello world' inside 'body'" in message
+        assert "Found 'Hover me!' inside '#hoverable'" in message
+        assert "Not there" not in message
+
     def test_assertTextAbsent_script(self):
         # This is a test that we are parsing script tags properly.
         self.get_literal_url(reverse("delayed_appearance") + "?add_js_delay=100")
@@ -435,6 +482,71 @@ class CommonBase(FuncBaseMixin):
         sess_dict = self.get_session_data()
         assert sess_dict == {"foo": "bar"}
 
+    def test_session_transaction(self):
+        with self.session_transaction() as session:
+            session["name"] = "The Jabberwocky"
+            self.set_session_data({"other": "thing"})
+            assert self.get_session_data() == {"name": "The Jabberwocky", "other": "thing"}
+        assert self.get_session_data() == {"name": "The Jabberwocky", "other": "thing"}
+        self.get_url("test_misc")
+        self.assertTextPresent("Hello to The Jabberwocky")
+
+    def test_session_transaction_exception(self):
+        self.set_session_data({"name": "The Jabberwocky"})
+        with pytest.raises(ValueError):
+            with self.session_transaction() as session:
+                session["name"] = "The Bandersnatch"
+                raise ValueError()
+        assert self.get_session_data() == {"name": "The Jabberwocky"}
+
+    def test_session_transaction_flush(self):
+        self.set_session_data({"name": "The Jabberwocky"})
+        with self.session_transaction() as session:
+            self.flush_session()
+            session["other"] = "thing"
+        assert self.get_session_data() == {"other": "thing"}
+
+    def test_checkpoint_restore(self):
+        self.set_session_data({"name": "The Jabberwocky"})
+        self.get_url("test_misc")
+        self.checkpoint("misc")
+
+        self.new_browser_session()
+        assert self.restore("misc")
+        self.assertUrlsEqual(reverse("test_misc"))
+        self.assertTextPresent("Hello to The Jabberwocky")
+        assert self.get_session_data() == {"name": "The Jabberwocky"}
+
+        # Can be restored over a different page and session
+        self.set_session_data({"name": "The Bandersnatch"})
+        self.get_url("list_things")
+        assert self.restore("misc")
+        self.assertUrlsEqual(reverse("test_misc"))
+        assert self.get_session_data() == {"name": "The Jabberwocky"}
+
+    def test_restore_missing_checkpoint(self):
+        assert not self.restore("missing")
+
+    def test_restore_after_db_change(self):
+        self.get_url("list_things")
+        self.checkpoint("list_things")
+        Thing.objects.create(name="Paper", element_type=Thing.ELEMENT_AIR, count=1)
+        assert not self.restore("list_things")
+
+    def test_restore_after_update_not_detected(self):
+        # Documented limitation of the default get_checkpoint_db_state
+        self.get_url("list_things")
+        self.checkpoint("list_things_updated")
+        Thing.objects.update(name="Paper")
+        assert self.restore("list_things_updated")
+
+    def test_checkpoint_models(self):
+        self.checkpoint_models = [Thing]
+        assert [label for label, count, max_pk in self.get_checkpoint_db_state()] == [Thing._meta.label]
+        self.checkpoint_models = []
+        with self.assertNumQueries(0):
+            assert self.get_checkpoint_db_state() == []
+
     def test_value(self):
         self.get_url("edit_thing", thing_id=self.thing.id)
         assert self.value("#id_name") == "Rock"
@@ -534,8 +646,92 @@ class CommonBase(FuncBaseMixin):
         assert self.get_element_attribute("#self-link-3", "does-not-exist") is None
         assert self.get_element_attribute("#does-not-exist-3", "id") is None
 
+    def test_action_log(self):
+        self.record_actions = True
+        self.get_url("list_things")
+        self.follow_link("a.edit")
+        self.submit("button[name=clear]")
+        assert [(record.action, record.target) for record in self.action_log] == [
+            ("get_url", "list_things"),
+            ("follow_link", "a.edit"),
+            ("submit", "button[name=clear]"),
+        ]
+        for record in self.action_log:
+            assert record.requests >= 1
+            assert record.queries >= 1
+            assert record.bytes > 0
+            assert record.wall_time >= record.server_time > 0
+
+    def test_action_log_off_by_default(self):
+        self.get_url("list_things")
+        assert self.action_log == []
+        with self.assertMaxQueries(100):
+            self.get_url("list_things")
+        self.get_url("list_things")
+        assert [record.action for record in self.action_log] == ["get_url"]
+
+    def test_assertMaxQueries(self):
+        with self.assertMaxQueries(100):
+            self.get_url("list_things")
+        with pytest.raises(AssertionError, match=r"more than 0:(.|\n)*get_url list_things"):
+            with self.assertMaxQueries(0):
+                self.get_url("list_things")
+
+    def test_assertMaxLatency(self):
+        with self.assertMaxLatency(60):
+            self.get_url("list_things")
+        with pytest.raises(AssertionError, match=r"1 actions took longer than 0s"):
+            with self.assertMaxLatency(0):
+                self.get_url("list_things")
+
+    def test_assertNoRepeatedQueries(self):
+        for i in range(4):
+            Thing.objects.create(name=f"Thing {i}", element_type=Thing.ELEMENT_AIR)
+        with self.assertNoRepeatedQueries():
+            self.get_url("list_things")
+        with self.assertNoRepeatedQueries(max_repeats=5):
+            self.get_url("n_plus_one")
+        assert len(self.action_log[-1].sql) >= 6
+        with pytest.raises(
+            AssertionError, match=r'get_url n_plus_one:\n  5 x SELECT .* WHERE "[a-z_]+"."id" = \? LIMIT \?'
+        ):
+            with self.assertNoRepeatedQueries():
+                self.get_url("n_plus_one")
+
 
 class TestFuncWebTestCommon(CommonBase, WebTestBase):
+    def test_action_log_summary(self):
+        self.record_actions = True
+        self.get_url("list_things")
+        with self.assertLogs("django_functest.instrumentation", "INFO") as logs:
+            self.doCleanups()
+        assert "get_url list_things" in logs.output[0]
+
+    def test_restore_resets_forms(self):
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        self.checkpoint("edit_thing")
+        assert self.restore("edit_thing")
+        self.fill({"#id_name": "Changed"})
+        assert self.value("#id_name") == "Changed"
+        assert self.restore("edit_thing")
+        assert self.value("#id_name") == "Rock"
+
+    def test_session_transaction_saves_once(self):
+        self.set_session_data({"name": "The Jabberwocky"})
+        SessionStore = _get_session_store_class(settings.SESSION_ENGINE)
+        load = mock.patch.object(SessionStore, "load", autospec=True, side_effect=SessionStore.load)
+        save = mock.patch.object(SessionStore, "save", autospec=True, side_effect=SessionStore.save)
+        update_cookie = mock.patch.object(self, "_update_session_cookie", wraps=self._update_session_cookie)
+        with load as load, save as save, update_cookie as update_cookie:
+            with self.session_transaction():
+                self.set_session_data({"a": "1"})
+                self.set_session_data({"b": "2"})
+                self.set_session_data({"c": "3"})
+        assert load.call_count == 1
+        assert save.call_count == 1
+        assert update_cookie.call_count <= 1
+        assert self.get_session_data() == {"name": "The Jabberwocky", "a": "1", "b": "2", "c": "3"}
+
     ElementNotFoundException = WebTestNoSuchElementException
     TextNotFoundException = ValueError
     ElementUnusableException = WebTestCantUseElement
@@ -605,6 +801,148 @@ class TestFuncWebTestCommon(CommonBase, WebTestBase):
         with pytest.raises(WebTestMultipleElementsException):
             self.submit("form")
 
+    def test_dom_index_matches_css_query(self):
+        self.get_url("list_things")
+        self.get_url("test_misc")
+        index = self._get_dom_index(self.last_response)
+        pq = self._make_pq(self.last_response)
+        for selector in [
+            "p",
+            "P",
+            "#self-link-1",
+            "a#self-link-2",
+            "p#self-link-2",
+            "#does-not-exist",
+            'a[href="."]',
+            "a[href='?param1=val2&param2']",
+            "[name=foo]",
+            'a:contains("Another")',
+            'a:contains("A link to self")',
+            "a:contains('not there')",
+        ]:
+            elems = index.find(selector)
+            assert elems is not None, selector
+            assert elems == list(pq.find(selector)), selector
+
+        # Not handled by the index:
+        assert index.find("p.myclass") is None
+        assert index.find("body p") is None
+        assert index.find("[href='.']") is None
+
+    def test_dom_index_built_once_per_response(self):
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        index = self._get_dom_index(self.last_response)
+        assert self.is_element_present("#id_name")
+        assert self.value("[name=name]") == "Rock"
+        assert self._get_dom_index(self.last_response) is index
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        assert self._get_dom_index(self.last_response) is not index
+
+    def test_fill_resolves_all_selectors_first(self):
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        with pytest.raises(WebTestNoSuchElementException):
+            self.fill({"#id_name": "New name", "#id_blahblah": "x"})
+        # Nothing should have been changed
+        assert self.value("#id_name") == "Rock"
+
+    def test_dom_index_form_map(self):
+        self.get_url("auto_submit_form")
+        index = self._get_dom_index(self.last_response)
+        pq = self._make_pq(self.last_response)
+        forms = list(pq("form"))
+        assert len(forms) > 1
+        for i, form_elem in enumerate(forms):
+            assert index.get_form_position(form_elem) == i
+            for elem in form_elem.iterdescendants():
+                assert index.get_form(elem) is form_elem
+        assert index.get_form(pq("body")[0]) is None
+
+    def test_serialized_spans_match_tostring(self):
+        for url in [
+            reverse("test_misc"),
+            reverse("list_things"),
+            reverse("edit_thing", kwargs={"thing_id": self.thing.id}),
+            reverse("admin:login"),
+            reverse("delayed_appearance"),
+        ]:
+            self.get_literal_url(url)
+            doc = self._get_parsed_document(self.last_response)
+            root = doc.pq[0]
+            for elem in root.iter():
+                if isinstance(elem.tag, str):
+                    assert doc.serialize(elem) == etree.tostring(elem, encoding="unicode")
+            # Check we really used the offsets, not the fallback
+            assert doc._element_strings == {}
+
+    def test_text_assertions_serialize_once(self):
+        self.get_url("test_misc")
+        doc = self._get_parsed_document(self.last_response)
+        with mock.patch("django_functest.dom.etree.tostring", wraps=etree.tostring) as tostring:
+            self.assertTextPresent("Hello world")
+            self.assertTextPresent("Hello world", within="p")
+            self.assertTextAbsent("Not there", within="p")
+            with pytest.raises(AssertionError):
+                self.assertTextPresent("Not there", within="#inner-text-test-1")
+        assert tostring.call_count == 1
+        assert doc._serialized is not None
+
+    def test_assertTextPresent_streaming(self):
+        self.streaming_search_threshold = 0
+        self.get_url("test_misc")
+        self.assertTextPresent("Hello world")
+        self.assertTextPresent("Hover me!", within="#hoverable")
+        # Found without parsing the full document:
+        assert len(self.parse_cache) == 0
+        with pytest.raises(AssertionError):
+            self.assertTextPresent("Hover me!", within="p.myclass")
+        with pytest.raises(AssertionError):
+            self.assertTextPresent("Something definitely not there")
+        assert len(self.parse_cache) == 1
+
+    def test_parse_cache_counters(self):
+        self.get_url("test_misc")
+        cache = self.parse_cache
+        misses = cache.misses
+        self.assertTextPresent("Hello world")
+        assert cache.misses == misses + 1
+        hits = cache.hits
+        self.assertTextPresent("Hello world")
+        assert self.is_element_present("#self-link-1")
+        assert cache.misses == misses + 1
+        assert cache.hits == hits + 2
+
+    def test_parse_cache_eviction(self):
+        self.parse_cache.max_entries = 2
+        for i in range(4):
+            self.get_url("test_misc")
+            self.assertTextPresent("Hello world")
+        assert len(self.parse_cache) == 2
+        assert self.parse_cache.evictions == 2
+
+        self.parse_cache.max_entries = None
+        self.parse_cache.max_bytes = 1
+        self.get_url("test_misc")
+        self.assertTextPresent("Hello world")
+        # Most recent is always kept
+        assert len(self.parse_cache) == 1
+        assert self.parse_cache.current_bytes == len(self.last_response.testbody)
+
+    def test_parse_cache_weak_references(self):
+        self.get_url("list_things")
+        self.get_url("test_misc")
+        self.assertTextPresent("Hello world")
+        assert len(self.parse_cache) == 1
+        self.back()
+        gc.collect()
+        assert len(self.parse_cache) == 0
+        assert self.parse_cache.current_bytes == 0
+        assert self.parse_cache.evictions == 0
+
+
+class TestFuncAsgiTestCommon(FuncAsgiTestMixin, TestFuncWebTestCommon):
+    # The same tests, using the ASGI handler
+    pass
+
 
 class FuncSeleniumCommonBase(CommonBase):
     ElementNotFoundException = TimeoutException
@@ -645,6 +983,63 @@ class FuncSeleniumCommonBase(CommonBase):
             self._driver.execute_script('return document.querySelector("#id_onchange_log").value') == "id_name,id_big,"
         )
 
+    def test_fast_fill(self):
+        self.fast_fill = True
+        self.test_fill()
+
+    def test_value_one_script(self):
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        for css_selector, expected in [
+            ("#id_name", "Rock"),
+            ("#id_big", True),
+            ("#id_element_type", Thing.ELEMENT_EARTH),
+            ("#id_category_1", str(Thing.CATEGORY_MAGMA)),
+        ]:
+            with mock.patch.object(self._driver, "execute_script", wraps=self._driver.execute_script) as execute_script:
+                assert self.value(css_selector) == expected
+            assert execute_script.call_count == 1
+
+    def test_fill_radio_button_missing(self):
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        with pytest.raises(NoSuchElementException, match="No radio button with value '7'"):
+            self.fill({"#id_category_0": 7})
+
+    def test_fast_fill_one_script(self):
+        self.fast_fill = True
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        with mock.patch.object(self._driver, "execute_script", wraps=self._driver.execute_script) as execute_script:
+            with mock.patch.object(self._driver, "find_element", wraps=self._driver.find_element) as find_element:
+                self.fill(
+                    {
+                        "#id_name": "New name",
+                        "#id_big": False,
+                        "#id_element_type": Thing.ELEMENT_AIR,
+                        "#id_category_1": Thing.CATEGORY_QUASIGROUP,
+                        "#id_description": "Soft thing\r\nwith line breaks",
+                    }
+                )
+        assert execute_script.call_count == 1
+        find_element.assert_not_called()
+        assert self.value("#id_name") == "New name"
+        assert self.value("#id_big") is False
+        assert self.value("#id_element_type") == Thing.ELEMENT_AIR
+        assert self.value("[name=category]") == str(Thing.CATEGORY_QUASIGROUP)
+        assert self.value("#id_description") == "Soft thing\nwith line breaks"
+
+    def test_fast_fill_onchange(self):
+        self.fast_fill = True
+        self.test_fill_onchange()
+
+    def test_fast_fill_upload(self):
+        # Uploads need typing
+        self.fast_fill = True
+        self.test_file_upload()
+
+    def test_fast_fill_exclude(self):
+        self.fast_fill = True
+        self.fast_fill_exclude = "#id_name"
+        self.test_fill()
+
     def test_submit_no_wait_for_reload(self):
         self.get_url("edit_thing", thing_id=self.thing.id)
         self.submit("button[name=check]", wait_for_reload=False)
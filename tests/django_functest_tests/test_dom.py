@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+from django_functest.dom import ParsedDocument, compile_selector, css_select, stream_search
+from lxml import etree
+from pyquery import PyQuery
+
+HTML = """<html><body>
+<p class="intro">Hello <a href="/one/">Link one</a></p>
+<form id="f"><input name="a"><input name="b" type="checkbox"></form>
+<div><p>Nested <b>bold</b></p></div>
+</body></html>"""
+
+XML = """<root><item id="x">One</item><item>Two</item><Item>Three</Item></root>"""
+
+
+class TestCssSelect(TestCase):
+    def test_same_results_as_pyquery(self):
+        for source, parser, selectors in [
+            (HTML, "html", ["p", "P", "p.intro", "div p b", "form input[name=b]", 'a:contains("one")', "html", "body"]),
+            (XML, "xml", ["item", "Item", "#x", "root"]),
+        ]:
+            pq = PyQuery(source, parser=parser)
+            for selector in selectors:
+                assert css_select(pq, selector) == list(pq.find(selector)), selector
+
+    def test_compiled_once(self):
+        compile_selector.cache_clear()
+        pq = PyQuery(HTML, parser="html")
+        css_select(pq, "p.intro")
+        css_select(pq, "p.intro")
+        info = compile_selector.cache_info()
+        assert info.misses == 1
+        assert info.hits == 1
+
+
+class TestParsedDocument(TestCase):
+    def test_serialize(self):
+        source = """<!DOCTYPE html><html><body>
+<p title="a>b<c" data-x='q"'>x &gt; y <br> <!-- c < d --> <script>if (a < b) {}</script>tail<?pi x?></p>
+<textarea>Line 1\r\nLine 2</textarea><img src="x.png">after<p>Caf\u00e9 &amp; \U0001f604</p>
+</body></html>"""
+        doc = ParsedDocument(PyQuery(source, parser="html"), size=len(source))
+        for elem in doc.pq[0].iter():
+            if isinstance(elem.tag, str):
+                assert doc.serialize(elem) == etree.tostring(elem, encoding="unicode")
+        assert doc._element_strings == {}
+        (p,) = doc.select("p[title]")
+        assert doc.serialized_contains(p, "x &gt; y")
+        assert doc.serialized_contains(p, "tail")
+        assert not doc.serialized_contains(p, "Line 1")
+
+    def test_serialize_xml(self):
+        # Falls back to serializing elements individually
+        source = """<root xmlns:a="urn:a"><a:item id="x">One</a:item><item>Two</item></root>"""
+        doc = ParsedDocument(PyQuery(source, parser="xml"), size=len(source))
+        for elem in doc.pq[0].iter():
+            assert doc.serialize(elem) == etree.tostring(elem, encoding="unicode")
+
+
+class TestStreamSearch(TestCase):
+    SOURCE = """<html><body>
+<p id="first">Hello <b>world</b> &amp; friends</p>
+<div id="other">Tail test <i>x</i> after the i</div>
+<script>if (a < b) {}</script>
+</body></html>"""
+
+    def test_found(self):
+        assert stream_search(self.SOURCE, "body", "Hello ")
+        assert stream_search(self.SOURCE, "body", "&amp; friends")
+        assert stream_search(self.SOURCE, "#other", "after the i")
+        assert stream_search(self.SOURCE, "div#other", "x")
+        assert stream_search(self.SOURCE, "p", "world")
+        assert stream_search(self.SOURCE, "body", "a &lt; b")
+
+    def test_not_found(self):
+        assert stream_search(self.SOURCE, "#first", "Tail test") is False
+        # Spans markup, needs a full search:
+        assert stream_search(self.SOURCE, "body", "Hello <b>") is False
+        assert stream_search(self.SOURCE, "body", "a < b") is False
+
+    def test_unsupported(self):
+        assert stream_search(self.SOURCE, "p.myclass", "Hello") is None
+        assert stream_search(self.SOURCE, "body p", "Hello") is None
+        assert stream_search(self.SOURCE, "body", "Hello\r\n") is None
+
+    def test_small_chunks(self):
+        assert stream_search(self.SOURCE, "#other", "after the i", chunk_size=3)
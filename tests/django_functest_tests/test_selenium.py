@@ -1,11 +1,18 @@
 import os
 import time
 from functools import wraps
+from unittest import TestCase, mock
 
 import pytest
 from django.contrib.auth import get_user_model
-from django_functest import AdminLoginMixin, FuncBaseMixin
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from django_functest import AdminLoginMixin, FuncBaseMixin, FuncSeleniumMixin, funcselenium
+from selenium import webdriver
+from selenium.common.exceptions import (
+    ElementNotInteractableException,
+    NoSuchElementException,
+    TimeoutException,
+    WebDriverException,
+)
 
 from .base import ChromeBase, FirefoxBase
 from .models import Thing
@@ -99,6 +106,29 @@ class FuncSeleniumSpecificBase(AdminLoginMixin, FuncBaseMixin):
         retval = self.execute_script("return arguments[0] + arguments[1];", 1, 2)
         assert retval == 3
 
+    def test_get_page_metrics(self):
+        self.get_url("test_misc")
+        metrics = self.get_page_metrics()
+        assert set(metrics) == {
+            "ttfb",
+            "dom_content_loaded",
+            "load",
+            "lcp",
+            "cls",
+            "resource_count",
+            "transfer_bytes",
+        }
+        assert 0 < metrics["ttfb"] <= metrics["dom_content_loaded"] <= metrics["load"]
+        assert metrics["transfer_bytes"] > 0
+
+    def test_assertPageMetricsWithin(self):
+        self.get_url("test_misc")
+        self.assertPageMetricsWithin(ttfb=60000, load=60000, cls=1)
+        with pytest.raises(AssertionError, match=r"transfer_bytes is \d+, more than 0"):
+            self.assertPageMetricsWithin(transfer_bytes=0)
+        with pytest.raises(ValueError):
+            self.assertPageMetricsWithin(not_a_metric=1)
+
     def test_hover(self):
         self.get_url("test_misc")
         get_style = "return document.defaultView.getComputedStyle(document.querySelector('#hoverable'))['font-style']"
@@ -152,12 +182,109 @@ class FuncSeleniumSpecificBase(AdminLoginMixin, FuncBaseMixin):
         self.wait_until(self.assertion_passes(self.assertTextPresent, "Hello!", within="#id_container"))
         self.assertTextPresent("Hello!", within="#id_container")
 
+    def test_wait_for_page_load_document_unloaded(self):
+        # The document is unloaded while the async script is waiting for it
+        self.get_url("test_misc")
+        url = reverse("list_things")
+        self.execute_script(
+            f"document.pageReloadedYetFlag = 'notyet'; setTimeout(function () {{ location.href = '{url}'; }}, 500);"
+        )
+        self.wait_for_page_load()
+        self.assertUrlsEqual(url)
+        assert self.execute_script("return document.readyState") == "complete"
+
+    def test_click_waits_without_polling(self):
+        self.get_url("list_things")
+        with mock.patch.object(self._driver, "execute_script", wraps=self._driver.execute_script) as execute_script:
+            self.click("a.edit", wait_for_reload=True)
+        assert funcselenium._PAGE_READY_SCRIPT not in [c[0][0] for c in execute_script.call_args_list]
+        assert self.execute_script("return document.readyState") == "complete"
+        self.assertUrlsEqual(reverse("edit_thing", kwargs={"thing_id": self.thing.id}))
+
+    def test_wait_for_async_script(self):
+        self.get_url("test_misc")
+        script = """
+var done = arguments[arguments.length - 1];
+setTimeout(function () { done(document.title); }, 200);
+"""
+        fallback = mock.Mock()
+        assert self._wait_for_async_script(script, fallback) == "Stuff"
+        fallback.assert_not_called()
+
+    def test_text_assertions_in_browser(self):
+        # Texts are searched for by a script, without fetching the page source,
+        # unless the selector only works with PyQuery.
+        self.get_url("test_misc")
+        with mock.patch.object(
+            self, "_get_parsed_page_source", wraps=self._get_parsed_page_source
+        ) as get_parsed_page_source:
+            self.assertTextPresent("from 'me' & \"friends\"")
+            self.assertTextsPresent(["Hello world", ("Hover me!", "#hoverable")])
+            self.assertTextsAbsent(["Not there", ("Hello world", "p.myclass")])
+            with pytest.raises(AssertionError, match="'Hello world' unexpectedly found"):
+                self.assertTextAbsent("Hello world")
+            assert get_parsed_page_source.call_count == 0
+            self.assertTextPresent("Some text", within="p:contains('with a class')", wait=False)
+            assert get_parsed_page_source.call_count == 1
+
+    def test_dom_snapshots(self):
+        self.dom_snapshots = True
+        self.get_literal_url(reverse("delayed_appearance") + "?add_js_delay=1")
+        assert not self.is_element_present("#new_stuff")
+        self.assertTextAbsent("Hello!", within="#id_container")
+        # The snapshot is replaced when the DOM changes:
+        self.wait_until(lambda driver: self.is_element_present("#new_stuff"))
+        self.assertTextPresent("Hello!", within="#id_container")
+        assert self.get_element_attribute("#new_stuff", "id") == "new_stuff"
+
+    def test_dom_snapshots_no_element_lookups(self):
+        self.dom_snapshots = True
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        with mock.patch.object(self, "_find", wraps=self._find) as find:
+            assert self.is_element_present("#id_name")
+            assert not self.is_element_present("#id_not_there")
+            assert self.get_element_attribute("#id_name", "maxlength") == "255"
+            assert self.get_element_attribute("#id_name", "required") == "true"
+            find.assert_not_called()
+            # Pseudo-classes are left to the browser
+            assert self.is_element_present("#id_big:checked")
+            assert find.call_count == 1
+
+    def test_dom_snapshots_attributes(self):
+        # Results are the same with and without snapshots, including for
+        # attributes that reflect the state of the page.
+        def get_attributes(checks):
+            return [self.get_element_attribute(css_selector, attribute) for css_selector, attribute in checks]
+
+        self.get_url("test_misc")
+        link_checks = [("#self-link-3", "href"), ("#self-link-3", "id")]
+        expected = get_attributes(link_checks)
+        assert expected == ["?param1=val2&param2", "self-link-3"]
+        self.dom_snapshots = True
+        assert get_attributes(link_checks) == expected
+
+        self.dom_snapshots = False
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        self.fill({"#id_name": "Typed in", "#id_big": False})
+        field_checks = [("#id_name", "value"), ("#id_name", "name"), ("#id_big", "checked"), ("#id_big", "type")]
+        expected = get_attributes(field_checks)
+        self.dom_snapshots = True
+        assert get_attributes(field_checks) == expected
+
     def test_scroll_method_legacy(self):
         self.scroll_method = "legacyWindowScrollTo"
         self.get_literal_url(reverse("long_page") + "?count=1000")
         self.submit('[name="mybutton"]')
         self.assertTextPresent("mybutton was pressed")
 
+    def test_fill_hidden_element(self):
+        # Hidden elements aren't scrolled to, which would time out with this
+        # scroll method.
+        self.scroll_method = "legacyWindowScrollTo"
+        self.get_url("edit_thing", thing_id=self.thing.id)
+        with pytest.raises(ElementNotInteractableException):
+            self.fill({"#id_badinput1": "Hello"})
+
     def test_scroll_method_auto(self):
         self.scroll_method = "auto"
         self.get_literal_url(reverse("long_page") + "?count=1000")
@@ -250,3 +377,123 @@ class TestBrowserSizeFirefox(BrowserSizeBase, FirefoxBase):
 
 class TestBrowserSizeChrome(BrowserSizeBase, ChromeBase):
     pass
+
+
+# Test class attributes `blocked_url_patterns` and `resource_type_blocklist`:
+
+
+class BlockedRequestsBase:
+    blocked_url_patterns = ["*/admin/js/*"]
+    resource_type_blocklist = ["image"]
+
+    def test_blocked_requests(self):
+        self.get_url("with_subresources")
+        # Two icons (one used twice) and a script
+        counts = self.get_blocked_request_counts()
+        assert sum(counts.values()) >= 3
+        assert list(counts) == [self.live_server_url + reverse("with_subresources")]
+
+    def test_blocked_requests_per_page(self):
+        # Requests are counted against the page that made them, even after
+        # leaving it.
+        self.get_url("with_subresources")
+        self.get_url("test_misc")
+        assert self.get_blocked_request_counts()[self.live_server_url + reverse("with_subresources")] >= 3
+
+
+class TestBlockedRequestsFirefox(BlockedRequestsBase, FirefoxBase):
+    pass
+
+
+class TestBlockedRequestsChrome(BlockedRequestsBase, ChromeBase):
+    pass
+
+
+# Fallbacks for drivers that can't do everything, tested with a fake driver:
+
+
+class FakeDriverTest(FuncSeleniumMixin):
+    _driver = None
+    default_timeout = 1
+
+
+class TestWaitForAsyncScript(TestCase):
+    def test_fallback(self):
+        test = FakeDriverTest()
+        test._driver = mock.Mock()
+        test._driver.execute_async_script.side_effect = WebDriverException("Not supported")
+        callback = mock.Mock(side_effect=[False, False, True])
+        assert test._wait_for_async_script("script", callback) is True
+        assert callback.call_count == 3
+
+
+class TestWaitForPage(TestCase):
+    def test_fallback(self):
+        test = FakeDriverTest()
+        test._driver = mock.Mock()
+        test._driver.execute_async_script.side_effect = WebDriverException("Not supported")
+        test._driver.execute_script.return_value = {"size": 100}
+        test.wait_for_page_load()
+        test._driver.execute_script.assert_called_once_with(funcselenium._PAGE_READY_SCRIPT, True)
+
+    def test_overridden_hook(self):
+        test = FakeDriverTest()
+        test._driver = mock.Mock()
+        with mock.patch.object(FakeDriverTest, "wait_for_page_load") as wait_for_page_load:
+            assert test._wait_until_finished() == 0
+        wait_for_page_load.assert_called_once_with()
+        test._driver.execute_async_script.assert_not_called()
+
+
+class BlockingFakeDriverTest(FakeDriverTest):
+    blocked_url_patterns = ["*fonts.example.com*"]
+    resource_type_blocklist = ["font"]
+
+
+class TestBlockedRequests(TestCase):
+    def setUp(self):
+        self.test = BlockingFakeDriverTest()
+
+    def test_get_blocked_url_patterns(self):
+        patterns = self.test.get_blocked_url_patterns()
+        assert patterns[0] == "*fonts.example.com*"
+        assert "*.woff2" in patterns
+        assert "*.woff2?*" in patterns
+
+    def test_unknown_resource_type(self):
+        with mock.patch.object(BlockingFakeDriverTest, "resource_type_blocklist", ["fonts"]):
+            with pytest.raises(ValueError, match="Unknown resource types: fonts"):
+                self.test.get_blocked_url_patterns()
+
+    def test_url_patterns_regex(self):
+        regex = funcselenium._url_patterns_regex(self.test.get_blocked_url_patterns())
+        assert regex.match("https://fonts.example.com/css?family=Foo")
+        assert regex.match("http://localhost/static/font.woff2?v=1")
+        assert not regex.match("http://localhost/static/font.woff2.html")
+        assert not regex.match("http://localhost/fonts/")
+
+    def test_firefox_old_selenium(self):
+        driver = mock.Mock(spec=webdriver.Firefox)
+        del driver.network
+        with self.assertLogs("django_functest.funcselenium", "WARNING") as logs:
+            self.test._block_requests(driver, self.test.get_blocked_url_patterns())
+        assert "this version of Selenium" in logs.output[0]
+        assert driver not in funcselenium._bidi_blocked_requests
+
+    def test_bidi_url_patterns(self):
+        assert funcselenium._bidi_url_patterns(["https://fonts.example.com/*", "http://localhost:8000/a.js"]) == [
+            {"type": "pattern", "protocol": "https", "hostname": "fonts.example.com"},
+            {"type": "string", "pattern": "http://localhost:8000/a.js"},
+        ]
+        assert funcselenium._bidi_url_patterns(["https://fonts.example.com/*", "*.woff2"]) is None
+        assert funcselenium._bidi_url_patterns(["*://fonts.example.com/*"]) is None
+
+    def test_firefox_url_patterns(self):
+        driver = mock.Mock(spec=webdriver.Firefox)
+        driver.network = mock.Mock()
+        self.test._block_requests(driver, ["https://fonts.example.com/*"])
+        assert driver.network.add_request_handler.call_args.kwargs == {
+            "url_patterns": [{"type": "pattern", "protocol": "https", "hostname": "fonts.example.com"}]
+        }
+        self.test._block_requests(driver, self.test.get_blocked_url_patterns())
+        assert driver.network.add_request_handler.call_args.kwargs == {}
@@ -0,0 +1,117 @@
+import threading
+
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DbSessionStore
+from django.contrib.sessions.models import Session
+from django.test import TestCase, override_settings
+from django_functest import sessions
+from django_functest.sessions import SessionStore
+
+from .base import WebTestBase
+from .test_utils import AdminLoginBase, ShortcutLoginBase
+
+IN_MEMORY_SESSIONS = override_settings(SESSION_ENGINE="django_functest.sessions")
+
+
+class InMemorySessionsMixin:
+    def setUp(self):
+        super().setUp()
+        sessions.clear()
+        self.addCleanup(sessions.clear)
+
+
+@IN_MEMORY_SESSIONS
+class TestShortcutLoginInMemorySessions(InMemorySessionsMixin, ShortcutLoginBase, WebTestBase):
+    def test_no_database_sessions(self):
+        self.shortcut_login(user=self.user)
+        self.get_url("admin:index")
+        assert Session.objects.count() == 0
+
+
+@IN_MEMORY_SESSIONS
+class TestAdminLoginInMemorySessions(InMemorySessionsMixin, AdminLoginBase, WebTestBase):
+    pass
+
+
+class TestInMemorySessionStore(InMemorySessionsMixin, TestCase):
+    def test_save_and_load(self):
+        store = SessionStore()
+        store["foo"] = "bar"
+        store.save()
+        loaded = SessionStore(session_key=store.session_key)
+        assert loaded["foo"] == "bar"
+        assert loaded.exists(store.session_key)
+
+    def test_load_missing(self):
+        store = SessionStore(session_key="x" * 32)
+        assert store.load() == {}
+        assert store.session_key is None
+
+    def test_update_missing(self):
+        store = SessionStore(session_key="x" * 32)
+        with self.assertRaises(UpdateError):
+            store.save()
+
+    def test_delete(self):
+        store = SessionStore()
+        store["foo"] = "bar"
+        store.save()
+        session_key = store.session_key
+        store.delete()
+        assert not store.exists(session_key)
+        assert SessionStore(session_key=session_key).load() == {}
+
+    def test_expired(self):
+        store = SessionStore()
+        store.set_expiry(-1)
+        store["foo"] = "bar"
+        store.save()
+        session_key = store.session_key
+        assert store.exists(session_key)
+        SessionStore.clear_expired()
+        assert not store.exists(session_key)
+
+    def test_threads(self):
+        keys = []
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(50):
+                    store = SessionStore()
+                    store["value"] = [n, i]
+                    store.save()
+                    store["value"] = [n, i, "updated"]
+                    store.save()
+                    keys.append((store.session_key, [n, i, "updated"]))
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        assert len({key for key, _ in keys}) == 400
+        for session_key, value in keys:
+            assert SessionStore(session_key=session_key)["value"] == value
+
+    @override_settings(DJANGO_FUNCTEST_SESSION_WRITE_THROUGH_ENGINE="django.contrib.sessions.backends.db")
+    def test_write_through(self):
+        store = SessionStore()
+        store["foo"] = "bar"
+        store.save()
+        session_key = store.session_key
+        assert DbSessionStore(session_key=session_key)["foo"] == "bar"
+
+        store["foo"] = "baz"
+        store.save()
+        assert DbSessionStore(session_key=session_key)["foo"] == "baz"
+
+        # Sessions missing from memory are read from the other engine
+        sessions.clear()
+        assert SessionStore(session_key=session_key)["foo"] == "baz"
+
+        store.delete()
+        assert not DbSessionStore().exists(session_key)
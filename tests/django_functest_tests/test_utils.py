@@ -1,9 +1,21 @@
 import inspect
-from unittest import TestCase
+import threading
+from unittest import TestCase, mock
 
 import pytest
-from django.contrib.auth import get_user_model
+from django.contrib.auth import authenticate, get_user_model
+from django.core import signals
+from django.db import connections
+from django.test import override_settings
 from django_functest import AdminLoginMixin, FuncBaseMixin, FuncSeleniumMixin, FuncWebTestMixin, ShortcutLoginMixin
+from django_functest.instrumentation import (
+    ActionRecorder,
+    QueryCounter,
+    RequestMonitor,
+    find_repeated_queries,
+    sql_shape,
+)
+from django_functest.utils import CommonMixin, _authenticated_users, _checkpoints
 
 from .base import ChromeBase, FirefoxBase, WebTestBase
 
@@ -36,6 +48,52 @@ class ShortcutLoginBase(ShortcutLoginMixin):
         self.get_url("admin:index")
         self.assertUrlsEqual("/admin/")
 
+    def test_login_credentials_cached(self):
+        with mock.patch("django_functest.utils.authenticate", wraps=authenticate) as mock_authenticate:
+            self.shortcut_login(username=self.user.username, password="password")
+            self.shortcut_logout()
+            self.shortcut_login(username=self.user.username, password="password")
+        assert mock_authenticate.call_count == 1
+        self.get_url("admin:index")
+        self.assertUrlsEqual("/admin/")
+
+    def test_login_cache_invalidated_by_password_change(self):
+        self.shortcut_login(username=self.user.username, password="password")
+        self.shortcut_logout()
+        self.user.set_password("password2")
+        self.user.save()
+        with pytest.raises(ValueError):
+            self.shortcut_login(username=self.user.username, password="password")
+        self.shortcut_login(username=self.user.username, password="password2")
+        self.get_url("admin:index")
+        self.assertUrlsEqual("/admin/")
+
+    def test_login_cache_invalidated_by_username_change(self):
+        self.shortcut_login(username=self.user.username, password="password")
+        self.shortcut_logout()
+        self.user.username = "admin2"
+        self.user.save()
+        with pytest.raises(ValueError):
+            self.shortcut_login(username="admin", password="password")
+
+    def test_login_cache_invalidated_by_deactivation(self):
+        self.shortcut_login(username=self.user.username, password="password")
+        self.shortcut_logout()
+        self.user.is_active = False
+        self.user.save()
+        with pytest.raises(ValueError):
+            self.shortcut_login(username=self.user.username, password="password")
+
+    def test_login_cache_does_not_keep_passwords(self):
+        self.shortcut_login(username=self.user.username, password="password")
+        assert "password" not in repr(list(_authenticated_users))
+
+    def test_warn_slow_password_hasher(self):
+        self.warn_slow_password_hasher = True
+        with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"]):
+            with pytest.warns(UserWarning, match="password hasher is slow"):
+                self.shortcut_login(username=self.user.username, password="password")
+
 
 class TestShortcutLoginWebTest(ShortcutLoginBase, WebTestBase):
     pass
@@ -130,3 +188,78 @@ class TestDocStrings(TestCase):
                 "The following methods have incorrect or missing docstrings "
                 "compared to FuncBaseMixin: \n" + "\n".join(f"{cls.__name__}.{name}" for cls, name in bad_docstrings)
             )
+
+
+class TestSqlShape(TestCase):
+    def test_values_replaced(self):
+        assert (
+            sql_shape('SELECT * FROM "t"  WHERE "t"."id" = %s AND name = \'O\'\'Brien\' LIMIT 21')
+            == 'SELECT * FROM "t" WHERE "t"."id" = ? AND name = ? LIMIT ?'
+        )
+
+    def test_in_lists_collapsed(self):
+        assert sql_shape('SELECT * FROM "t2" WHERE "t2"."id" IN (%s, %s, %s)') == sql_shape(
+            'SELECT * FROM "t2" WHERE "t2"."id" IN (%s)'
+        )
+        assert sql_shape('SELECT * FROM "t2" WHERE "t2"."id" IN (%s)') == 'SELECT * FROM "t2" WHERE "t2"."id" IN (...)'
+
+    def test_find_repeated_queries(self):
+        sql = ['SELECT * FROM "t" WHERE "id" = %s'] * 3 + ['SELECT * FROM "u"']
+        assert find_repeated_queries(sql, 2) == [('SELECT * FROM "t" WHERE "id" = ?', 3)]
+        assert find_repeated_queries(sql, 3) == []
+
+
+class TestRequestMonitor(TestCase):
+    def test_disconnect(self):
+        receivers = len(signals.request_started.receivers), len(signals.request_finished.receivers)
+        monitor = RequestMonitor()
+        recorder = ActionRecorder()
+        monitor.start(recorder)
+        assert (len(signals.request_started.receivers), len(signals.request_finished.receivers)) != receivers
+        monitor._request_started()
+        monitor._request_finished()
+        monitor.stop(recorder)
+        assert recorder.requests == 1
+        assert any(monitor.query_counter in conn.execute_wrappers for conn in connections.all())
+
+        monitor.disconnect()
+        assert (len(signals.request_started.receivers), len(signals.request_finished.receivers)) == receivers
+        assert not any(monitor.query_counter in conn.execute_wrappers for conn in connections.all())
+
+
+class TestQueryCounter(TestCase):
+    def test_uninstall_from_other_thread(self):
+        counter = QueryCounter()
+        thread_connections = []
+
+        def install():
+            counter.install()
+            thread_connections.extend(connections.all())
+
+        thread = threading.Thread(target=install)
+        thread.start()
+        thread.join()
+        assert all(counter in conn.execute_wrappers for conn in thread_connections)
+        counter.uninstall()
+        assert not any(counter in conn.execute_wrappers for conn in thread_connections)
+
+
+class TestCheckpointCleanup(TestCase):
+    def test_cleared_in_tearDownClass(self):
+        class Base:
+            @classmethod
+            def tearDownClass(cls):
+                pass
+
+        class First(CommonMixin, Base):
+            pass
+
+        class Second(CommonMixin, Base):
+            pass
+
+        _checkpoints[First, "step"] = _checkpoints[Second, "step"] = ([], {}, None)
+        First.tearDownClass()
+        assert (First, "step") not in _checkpoints
+        assert (Second, "step") in _checkpoints
+        Second.tearDownClass()
+        assert (Second, "step") not in _checkpoints
@@ -0,0 +1,206 @@
+import threading
+
+import pytest
+from django.urls import reverse
+
+from .base import FuncAsgiTestMixin, WebTestBase
+from .models import Thing
+
+
+class TestRunCrowd(WebTestBase):
+    def test_independent_sessions(self):
+        def visit(member):
+            member.get_url("new_browser_session_test")
+            member.assertTextPresent("Hello new user")
+            return member.get_session_data()["UID"]
+
+        results = self.run_crowd(visit, 5)
+        assert len({result.value for result in results}) == 5
+        for result in results:
+            assert result.exception is None
+            assert result.elapsed > 0
+            assert len(result.responses) == 1
+            assert [timing.status for timing in result.timings] == [200]
+
+    def test_sees_test_data(self):
+        Thing.objects.create(name="Paper", element_type=Thing.ELEMENT_AIR)
+
+        def visit(member):
+            member.get_url("list_things")
+            member.assertTextPresent("Paper")
+
+        self.run_crowd(visit, 3)
+
+    def test_members_overlap(self):
+        # This would time out if the members were run one after the other.
+        barrier = threading.Barrier(3, timeout=10)
+
+        def visit(member):
+            member.get_url("test_misc")
+            barrier.wait()
+            member.get_url("test_misc")
+
+        self.run_crowd(visit, 3, start_together=False)
+
+    def test_exceptions(self):
+        def visit(member):
+            raise ValueError("Oops")
+
+        with pytest.raises(ValueError):
+            self.run_crowd(visit, 2)
+
+        results = self.run_crowd(visit, 2, raise_exceptions=False)
+        assert all(isinstance(result.exception, ValueError) for result in results)
+
+    def test_main_session_unchanged(self):
+        self.get_url("test_misc")
+
+        def visit(member):
+            member.get_url("list_things")
+
+        self.run_crowd(visit, 2)
+        self.assertUrlsEqual("/test_misc/")
+
+    def test_member_state_not_shared(self):
+        member = self._make_crowd_member()
+        for name in ["_all_apps", "_cleanups", "_subresource_results", "_all_last_responses"]:
+            assert getattr(member, name) is not getattr(self, name)
+        assert member._outcome is None
+        cleanups = list(self._cleanups)
+        member.addCleanup(lambda: None)
+        assert self._cleanups == cleanups
+
+    def test_concurrent_writes(self):
+        # Without serialised database access, this fails with errors from
+        # savepoints, or lost session data.
+        things = [Thing.objects.create(name=f"Thing {i}", element_type=Thing.ELEMENT_AIR) for i in range(20)]
+        unused_things = list(things)
+        lock = threading.Lock()
+
+        def visit(member):
+            with lock:
+                thing = unused_things.pop()
+            member.get_url("new_browser_session_test")
+            member.get_url("edit_thing", thing_id=thing.id)
+            member.fill_by_name({"name": f"Changed {thing.id}"})
+            member.submit("input[name=change]")
+            member.get_url("new_browser_session_test")
+            member.assertTextPresent("Welcome back")
+            return member.get_session_data()["UID"]
+
+        results = self.run_crowd(visit, len(things))
+        assert len({result.value for result in results}) == len(things)
+        for thing in things:
+            thing.refresh_from_db()
+            assert thing.name == f"Changed {thing.id}"
+
+
+class TestRunCrowdAsgi(FuncAsgiTestMixin, TestRunCrowd):
+    pass
+
+
+class TestSubresources(WebTestBase):
+    def test_get_subresources(self):
+        self.get_url("with_subresources")
+        results = self.get_subresources()
+        assert [result.url for result in results] == [
+            "/static/admin/css/base.css",
+            "/static/admin/img/icon-yes.svg",
+            "/static/admin/js/core.js",
+            "/static/admin/img/icon-no.svg",
+        ]
+        for result in results:
+            assert result.status == 200
+            assert result.size > 0
+            assert result.elapsed >= 0
+
+    def test_results_are_reused(self):
+        self.get_url("with_subresources")
+        first = self.get_subresources()
+        self.get_url("with_subresources")
+        assert self.get_subresources() == first
+
+    def test_separate_cookiejar(self):
+        self.get_url("with_subresources")
+        self.set_session_data({"name": "Joe"})
+        app = self._subresource_app()
+        assert app is not self.app
+        assert app.cookiejar is not self.app.cookiejar
+        assert [cookie.value for cookie in app.cookiejar] == [cookie.value for cookie in self.app.cookiejar]
+        app.cookiejar.clear()
+        assert len(self.app.cookiejar) > 0
+
+    def test_assertNoBrokenSubresources(self):
+        self.get_url("with_subresources")
+        self.assertNoBrokenSubresources()
+        self.get_literal_url("/with_subresources/?missing=1")
+        with pytest.raises(AssertionError, match=r"/static/missing.png: 404"):
+            self.assertNoBrokenSubresources()
+
+    def test_check_subresources(self):
+        self.check_subresources = True
+        self.get_url("with_subresources")
+        with pytest.raises(AssertionError, match=r"/static/missing.png: 404"):
+            self.get_literal_url("/with_subresources/?missing=1")
+
+    def test_assertMaxPageWeight(self):
+        self.get_url("with_subresources")
+        total = len(self.last_response.body) + sum(result.size for result in self.get_subresources())
+        self.assertMaxPageWeight(total)
+        with pytest.raises(AssertionError, match=r"base\.css"):
+            self.assertMaxPageWeight(total - 1)
+
+
+class TestSubresourcesAsgi(FuncAsgiTestMixin, TestSubresources):
+    pass
+
+
+class TestCrawl(WebTestBase):
+    def test_crawl(self):
+        self.get_url("test_misc")
+        report = self.crawl("/crawl/0/")
+        assert sorted(page.url for page in report.pages) == sorted(
+            [
+                "/crawl/0/",
+                "/crawl/0/?a=1&b=2",
+                "/crawl/1/",
+                "/crawl/2/",
+                "/crawl/3/",
+                "/crawl/4/",
+                "/crawl/5/",
+                "/crawl/6/",
+                "/crawl/50/",
+                "/crawl/99/",
+            ]
+        )
+        # Current page is unchanged
+        self.assertUrlsEqual(reverse("test_misc"))
+
+        pages = {page.url: page for page in report.pages}
+        assert pages["/crawl/0/"].depth == 0
+        assert pages["/crawl/0/"].referrer is None
+        assert pages["/crawl/2/"].depth == 1
+        assert pages["/crawl/50/"].depth == 2
+        assert pages["/crawl/50/"].referrer == "/crawl/2/"
+        assert pages["/crawl/99/"].status == 302
+        assert pages["/crawl/1/"].queries == 1
+        assert [page.url for page in report.failures] == ["/crawl/50/"]
+        assert len(report.slowest(3)) == 3
+        assert "/crawl/50/: 404 (linked from /crawl/2/)" in str(report)
+
+    def test_from_current_page(self):
+        self.get_literal_url("/crawl/0/")
+        report = self.crawl(max_depth=1)
+        assert sorted(page.url for page in report.pages) == ["/crawl/0/", "/crawl/0/?a=1&b=2", "/crawl/1/", "/crawl/2/"]
+
+    def test_limits(self):
+        report = self.crawl("/crawl/0/", max_pages=4)
+        assert len(report.pages) == 4
+
+        report = self.crawl("/crawl/0/", include=[r"^/crawl/\d/$"], exclude=r"/crawl/2/")
+        assert sorted(page.url for page in report.pages) == ["/crawl/0/", "/crawl/1/", "/crawl/3/", "/crawl/4/"]
+        assert report.failures == []
+
+
+class TestCrawlAsgi(FuncAsgiTestMixin, TestCrawl):
+    pass
@@ -32,4 +32,8 @@ urlpatterns = [
     path(r"long_page/", views.long_page, name="long_page"),
     path(r"with_confirm", views.with_confirm, name="with_confirm"),
     path(r"web_components/", views.web_components, name="web_components"),
+    path(r"async_fragment/<int:number>/", views.async_fragment, name="async_fragment"),
+    path(r"with_subresources/", views.with_subresources, name="with_subresources"),
+    path(r"crawl/<int:number>/", views.crawl_page, name="crawl_page"),
+    path(r"n_plus_one/", views.n_plus_one, name="n_plus_one"),
 ]
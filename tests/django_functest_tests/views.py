@@ -1,7 +1,8 @@
+import asyncio
 import uuid
 
 from django import forms
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.utils.html import mark_safe
 
@@ -217,3 +218,39 @@ def with_confirm(request):
 
 def web_components(request):
     return render(request, "tests/web_components.html", {})
+
+
+async def async_fragment(request, number):
+    await asyncio.sleep(float(request.GET.get("delay", 0)))
+    return HttpResponse(f"<html><body><p>Fragment {number}</p></body></html>")
+
+
+def with_subresources(request):
+    return render(request, "tests/with_subresources.html", {"missing": "missing" in request.GET})
+
+
+def crawl_page(request, number):
+    # A small tree of pages for testing the crawler
+    if number == 99:
+        return HttpResponseRedirect("/crawl/0/")
+    if number >= 7:
+        raise Http404()
+    links = [f"/crawl/{child}/" for child in (2 * number + 1, 2 * number + 2) if child < 7]
+    links += ["#top", "https://example.com/", "mailto:someone@example.com"]
+    if number == 0:
+        links += ["?b=2&a=1", "/crawl/0/?a=1&b=2", "/crawl/0/#top"]
+    elif number == 1:
+        links += ["/crawl/99/"]
+    elif number == 2:
+        links += ["/crawl/50/"]
+    return HttpResponse(
+        f"<html><body><p>{Thing.objects.count()} things</p>"
+        + "".join(f'<a href="{link}">{link}</a>' for link in links)
+        + "</body></html>"
+    )
+
+
+def n_plus_one(request):
+    # Deliberately inefficient
+    names = [Thing.objects.get(id=thing.id).name for thing in Thing.objects.all()]
+    return HttpResponse("<html><body>" + "".join(f"<p>{name}</p>" for name in names) + "</body></html>")